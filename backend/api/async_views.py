@@ -0,0 +1,82 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+# Маршруты, которые под ASGI обслуживаются асинхронными обертками.
+# Потоковая выгрузка списка покупок остается синхронной: ASGI-обработчик
+# Django 3.2 не принимает асинхронные итераторы, а сборка файла целиком
+# в памяти лишила бы ее смысла.
+ASYNC_ROUTES = (
+    'recipe-list',
+    'recipe-detail',
+    'tag-list',
+    'tag-detail',
+    'ingredient-list',
+    'ingredient-detail',
+    'user-subscriptions',
+)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_VIEWS['WORKERS'],
+    thread_name_prefix='async-views'
+)
+
+
+def call_with_connections(func, *args, **kwargs):
+    """
+    Соединения с БД у потоков пула свои: перед вызовом и после него
+    закрываются устаревшие, как в начале и конце HTTP-запроса.
+    """
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_sync(func, *args, **kwargs):
+    """
+    Выполняет блокирующий код в пуле из ASYNC_VIEWS['WORKERS'] потоков
+    с копией contextvars текущего запроса (профиль, маршрутизация БД).
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        executor,
+        functools.partial(
+            context.run, call_with_connections, func, *args, **kwargs
+        )
+    )
+
+
+def render_response(response):
+    """
+    Ответ DRF рендерится в потоке пула: иначе Django выполнил бы это
+    в цикле событий. Потоковые ответы возвращаются без изменений.
+    """
+    if hasattr(response, 'render') and callable(response.render):
+        response.render()
+    return response
+
+
+def async_view(view):
+    """Асинхронная обертка синхронной вьюхи DRF."""
+    def call_view(request, *args, **kwargs):
+        return render_response(view(request, *args, **kwargs))
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run_sync(call_view, request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_patterns(patterns, names=ASYNC_ROUTES):
+    """Заменяет вьюхи маршрутов names асинхронными обертками."""
+    for pattern in patterns:
+        if pattern.name in names:
+            pattern.callback = async_view(pattern.callback)
+    return patterns
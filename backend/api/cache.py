@@ -0,0 +1,360 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+VERSION_KEY = 'reference:{namespace}:version'
+BODY_KEY = 'reference:{key}'
+RESPONSE_KEY = 'response:{key}'
+LOCK_KEY = 'response:{key}:lock'
+
+
+def conditional_response(request, body, etag, last_modified):
+    """Ответ из кеша с ETag/Last-Modified или 304."""
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = HttpResponse(
+            body, content_type=request.accepted_media_type
+        )
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+class ReferenceDataCache:
+    """
+    Кеш отрендеренных ответов справочников (теги, ингредиенты).
+    Первый уровень - LRU в памяти процесса, второй (необязательный) -
+    общий Django-кеш. Версия каждого справочника хранится в Django-кеше
+    и увеличивается сигналами при изменении данных, поэтому старые
+    записи перестают использоваться без явной очистки.
+    """
+    def __init__(self, max_entries, timeout, shared, cache_alias):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.shared = shared
+        self.cache_alias = cache_alias
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self):
+        return caches[self.cache_alias]
+
+    def get_version(self, namespace):
+        """Текущая версия справочника - время его последнего изменения."""
+        return self.backend.get_or_set(
+            VERSION_KEY.format(namespace=namespace), time.time(), None
+        )
+
+    def bump_version(self, namespace):
+        version = time.time()
+        self.backend.set(
+            VERSION_KEY.format(namespace=namespace), version, None
+        )
+        return version
+
+    def invalidate(self, namespace):
+        """
+        Увеличивает версию после коммита транзакции: иначе читатель
+        успел бы закешировать старые данные под новой версией, а откат
+        записи все равно сбросил бы кеш.
+        """
+        transaction.on_commit(lambda: self.bump_version(namespace))
+
+    def get(self, key):
+        """Возвращает (body, etag) или None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[:2]
+            if entry is not None:
+                self._delete(key)
+        if self.shared:
+            entry = self.backend.get(BODY_KEY.format(key=key))
+            if entry is not None:
+                self._set_local(key, *entry)
+                with self._lock:
+                    self.hits += 1
+                return entry
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, body):
+        etag = '"{0}"'.format(hashlib.md5(body).hexdigest())
+        self._set_local(key, body, etag)
+        if self.shared:
+            self.backend.set(
+                BODY_KEY.format(key=key), (body, etag), self.timeout
+            )
+        return etag
+
+    def _set_local(self, key, body, etag):
+        with self._lock:
+            if key in self._entries:
+                self._delete(key)
+            self._entries[key] = (body, etag, time.monotonic() + self.timeout)
+            self._size += len(body)
+            while len(self._entries) > self.max_entries:
+                self._delete(next(iter(self._entries)))
+
+    def _delete(self, key):
+        body = self._entries.pop(key)[0]
+        self._size -= len(body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+            }
+
+
+reference_cache = ReferenceDataCache(
+    max_entries=settings.REFERENCE_CACHE['MAX_ENTRIES'],
+    timeout=settings.REFERENCE_CACHE['TIMEOUT'],
+    shared=settings.REFERENCE_CACHE['SHARED'],
+    cache_alias=settings.REFERENCE_CACHE['CACHE_ALIAS'],
+)
+
+
+class ReferenceCacheMixin:
+    """
+    Миксин для read-only вьюсетов справочников.
+    Отдает закешированный JSON с заголовками ETag/Last-Modified
+    и отвечает 304, если данные у клиента не изменились.
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        version = reference_cache.get_version(self.cache_namespace)
+        key = '{0}:{1}:{2}'.format(
+            self.cache_namespace, version, request.get_full_path()
+        )
+        entry = reference_cache.get(key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            body = renderer.render(
+                response.data,
+                request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            entry = (body, reference_cache.set(key, body))
+        body, etag = entry
+        return conditional_response(request, body, etag, int(version))
+
+
+class ResponseCache:
+    """
+    Кеш отрендеренных ответов для анонимных запросов в Django-кеше.
+    Запись хранит версии ключей, от которых зависит ответ
+    ('recipe:<id>', 'author:<id>', 'recipes', 'tags', ...); если
+    какая-то версия изменилась или истек TIMEOUT, запись устарела.
+    Устаревшую запись отдают, пока один запрос под блокировкой
+    строит новую (stale-while-revalidate), поэтому холодный ключ
+    не приводит к одновременному пересчету во всех воркерах.
+    """
+    def __init__(self, timeout, stale_timeout, lock_timeout, wait,
+                 cache_alias):
+        self.timeout = timeout
+        self.stale_timeout = stale_timeout
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait
+        self.cache_alias = cache_alias
+
+    @property
+    def backend(self):
+        return caches[self.cache_alias]
+
+    @property
+    def entry_timeout(self):
+        """
+        Записи и версии живут не дольше TIMEOUT + STALE_TIMEOUT:
+        пропавшая версия создается заново и делает записи устаревшими.
+        """
+        return self.timeout + self.stale_timeout
+
+    def get_versions(self, namespaces):
+        """Текущие версии ключей одним запросом к кешу."""
+        keys = {
+            VERSION_KEY.format(namespace=namespace): namespace
+            for namespace in namespaces
+        }
+        versions = self.backend.get_many(keys)
+        missing = {key: time.time() for key in keys if key not in versions}
+        if missing:
+            self.backend.set_many(missing, self.entry_timeout)
+            versions.update(missing)
+        return {keys[key]: version for key, version in versions.items()}
+
+    def invalidate(self, *namespaces):
+        """Увеличивает версии ключей после коммита транзакции."""
+        def bump():
+            version = time.time()
+            self.backend.set_many({
+                VERSION_KEY.format(namespace=namespace): version
+                for namespace in namespaces
+            }, self.entry_timeout)
+
+        transaction.on_commit(bump)
+
+    def get(self, key):
+        return self.backend.get(RESPONSE_KEY.format(key=key))
+
+    def is_fresh(self, entry):
+        return (
+            time.time() - entry['created'] < self.timeout
+            and self.get_versions(entry['versions']) == entry['versions']
+        )
+
+    def set(self, key, body, namespaces):
+        entry = {
+            'body': body,
+            'etag': '"{0}"'.format(hashlib.md5(body).hexdigest()),
+            'versions': self.get_versions(namespaces),
+            'created': time.time(),
+        }
+        self.backend.set(
+            RESPONSE_KEY.format(key=key), entry, self.entry_timeout
+        )
+        return entry
+
+    def lock(self, key):
+        return self.backend.add(
+            LOCK_KEY.format(key=key), True, self.lock_timeout
+        )
+
+    def release(self, key):
+        self.backend.delete(LOCK_KEY.format(key=key))
+
+    def wait(self, key):
+        """Ждет, пока запись построит запрос, взявший блокировку."""
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = self.get(key)
+            if entry is not None:
+                return entry
+        return None
+
+
+response_cache = ResponseCache(
+    timeout=settings.RESPONSE_CACHE['TIMEOUT'],
+    stale_timeout=settings.RESPONSE_CACHE['STALE_TIMEOUT'],
+    lock_timeout=settings.RESPONSE_CACHE['LOCK_TIMEOUT'],
+    wait=settings.RESPONSE_CACHE['WAIT'],
+    cache_alias=settings.RESPONSE_CACHE['CACHE_ALIAS'],
+)
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Миксин для list/retrieve: анонимным пользователям ответ отдается
+    из response_cache. Вьюсет определяет get_cache_dependencies(data) -
+    ключи версий, от которых зависит ответ.
+    """
+    def list(self, request, *args, **kwargs):
+        return self.anonymous_cached_response(
+            request, super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.anonymous_cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+    def get_cache_dependencies(self, data):
+        return []
+
+    def get_response_cache_key(self, request):
+        """
+        URL с отсортированными параметрами запроса. Хост входит в ключ:
+        ссылки на изображения в ответе абсолютные.
+        """
+        params = sorted(
+            (name, sorted(values))
+            for name, values in request.query_params.lists()
+        )
+        return '{0}:{1}:{2}'.format(
+            self.basename,
+            self.action,
+            hashlib.md5('{0}?{1}'.format(
+                request.build_absolute_uri(request.path), params
+            ).encode()).hexdigest()
+        )
+
+    def anonymous_cached_response(self, request, handler, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if (not settings.RESPONSE_CACHE['ENABLED']
+                or request.user.is_authenticated
+                or renderer.format != 'json'):
+            return handler(request, *args, **kwargs)
+        key = self.get_response_cache_key(request)
+        entry = response_cache.get(key)
+        if entry is not None and response_cache.is_fresh(entry):
+            return self.cached_response(request, entry, 'HIT')
+        locked = response_cache.lock(key)
+        if not locked and entry is not None:
+            return self.cached_response(request, entry, 'STALE')
+        if not locked:
+            entry = response_cache.wait(key)
+            if entry is not None:
+                return self.cached_response(request, entry, 'HIT')
+        try:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            body = renderer.render(
+                response.data,
+                request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            entry = response_cache.set(
+                key, body, self.get_cache_dependencies(response.data)
+            )
+        finally:
+            if locked:
+                response_cache.release(key)
+        return self.cached_response(request, entry, 'MISS')
+
+    def cached_response(self, request, entry, state):
+        response = conditional_response(
+            request, entry['body'], entry['etag'], int(entry['created'])
+        )
+        response['X-Cache'] = state
+        return response
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def process_local_aliases():
+    """
+    Алиасы CACHES, которые используют включенные кеши API и роутер
+    реплик и при этом хранятся в памяти процесса.
+    """
+    aliases = {settings.REFERENCE_CACHE['CACHE_ALIAS']}
+    for config in (settings.RESPONSE_CACHE, settings.RECIPE_OVERLAY):
+        if config['ENABLED']:
+            aliases.add(config['CACHE_ALIAS'])
+    if settings.DATABASE_REPLICAS:
+        aliases.add(settings.REPLICA_ROUTER['CACHE_ALIAS'])
+    return sorted(
+        alias for alias in aliases
+        if settings.CACHES[alias]['BACKEND'] in LOCAL_CACHES
+    )
+
+
+def check_worker_caches():
+    """
+    Не дает запустить несколько воркеров с кешем в памяти процесса:
+    версии кешей, флаги пользователей и журнал индекса ингредиентов
+    у каждого воркера были бы свои, и воркеры отдавали бы устаревшие
+    данные. Вызывается из ApiConfig.ready.
+    """
+    aliases = process_local_aliases()
+    if settings.WEB_CONCURRENCY > 1 and aliases:
+        raise ImproperlyConfigured(
+            f'WEB_CONCURRENCY={settings.WEB_CONCURRENCY}, но кеши '
+            f'{", ".join(map(repr, aliases))} из CACHES хранятся в памяти '
+            'процесса: '
+            'укажите REDIS_URL или запустите один воркер.'
+        )
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Версии кешей API и журнал индекса ингредиентов должны быть видны
+    всем воркерам, иначе они отдают устаревшие данные.
+    """
+    return [
+        checks.Warning(
+            f'CACHES[{alias!r}] хранится в памяти процесса.',
+            hint='Для нескольких воркеров укажите общий бэкенд: '
+                 'REDIS_URL или CACHE_BACKEND и CACHE_LOCATION.',
+            id='api.W001',
+        )
+        for alias in process_local_aliases()
+    ]
@@ -1,10 +1,15 @@
 from django.db.models import BooleanField, ExpressionWrapper, Q
 from django_filters.rest_framework import FilterSet, filters
-from recipes.models import Ingredient, Recipe
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import search_recipes
 
 
 class IngredientFilter(FilterSet):
-    """Фильтр ингредиентов по названию"""
+    """
+    Фильтр ингредиентов по названию.
+    Поиск по UPPER(name) LIKE в PostgreSQL использует GIN-индекс pg_trgm
+    (миграция recipes.0004), на SQLite выполняется тот же запрос без него.
+    """
     name = filters.CharFilter(method='filter_name')
 
     class Meta:
@@ -12,23 +17,42 @@ class IngredientFilter(FilterSet):
         fields = ('name',)
 
     def filter_name(self, queryset, name, value):
-        """Метод возвращает кверисет с заданным именем ингредиента."""
+        """
+        Метод возвращает кверисет с заданным именем ингредиента:
+        сначала совпадения по началу названия, затем по вхождению.
+        """
         return queryset.filter(
-            Q(name__istartswith=value) | Q(name__icontains=value)
+            name__icontains=value
         ).annotate(
             startswith=ExpressionWrapper(
                 Q(name__istartswith=value),
                 output_field=BooleanField()
             )
-        ).order_by('-startswith')
+        ).order_by('-startswith', 'name')
 
 
 class RecipeFilter(FilterSet):
-    """Фильтр рецептов по автору/тегу/подписке/наличию в списке покупок"""
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    """
+    Фильтр рецептов по автору/тегу/подписке/наличию в списке покупок
+    и полнотекстовый поиск ?search= по названию, описанию и ингредиентам.
+    Сортировка ?ordering= по дате и счетчикам избранного/списков покупок.
+    """
+    # Автор фильтруется по id без загрузки пользователя, слаги тегов
+    # проверяются по таблице тегов только при наличии ?tags=,
+    # а не выборкой всех значений tags__slug на каждый запрос
+    author = filters.NumberFilter(field_name='author_id')
+    tags = filters.ModelMultipleChoiceFilter(
+        field_name='tags__slug',
+        to_field_name='slug',
+        queryset=Tag.objects.all()
+    )
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.OrderingFilter(
+        fields=('pub_date', 'favorites_count', 'in_carts_count')
+    )
 
     class Meta:
         model = Recipe
@@ -36,7 +60,9 @@ class RecipeFilter(FilterSet):
             'author',
             'tags',
             'is_favorited',
-            'is_in_shopping_cart'
+            'is_in_shopping_cart',
+            'search',
+            'ordering'
         )
 
     def filter_is_favorited(self, queryset, name, value):
@@ -48,3 +74,6 @@ class RecipeFilter(FilterSet):
         if value and self.request.user.is_authenticated:
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
@@ -0,0 +1,372 @@
+import asyncio
+import base64
+import io
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import User
+
+SCENARIOS = (
+    'recipes_anonymous',
+    'recipes_authenticated',
+    'recipe_detail',
+    'subscriptions',
+    'download_shopping_cart',
+    'ingredient_autocomplete',
+    'recipe_create',
+)
+# Сценарии, доступные в режиме --asgi (без транзакции с откатом)
+ASGI_SCENARIOS = SCENARIOS[:-1]
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            check=True,
+            text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), '#E26C2D').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+class TokenAsyncClient(AsyncClient):
+    """AsyncClient с заголовком Authorization: Token в каждом запросе."""
+    def __init__(self, token, **defaults):
+        super().__init__(**defaults)
+        self.token = token
+
+    def _base_scope(self, **request):
+        scope = super()._base_scope(**request)
+        scope['headers'].append(
+            (b'authorization', f'Token {self.token}'.encode())
+        )
+        return scope
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержки (p50/p90/p95/p99), пропускную способность '
+        'и число SQL-запросов горячих эндпоинтов API на текущей базе '
+        '(данные создает seed_benchmark). Запросы выполняются '
+        'последовательно тестовым клиентом DRF внутри процесса, '
+        'результат пишется в JSON для сравнения между коммитами. '
+        'С --asgi запросы идут через ASGI-обработчик (AsyncClient) '
+        'по --concurrency одновременно; асинхронные вьюхи включаются '
+        'переменной ASYNC_VIEWS_ENABLED=True.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на сценарий.')
+        parser.add_argument('--warmup', type=int, default=10,
+                            help='Запросов прогрева на сценарий.')
+        parser.add_argument('--scenario', action='append',
+                            choices=SCENARIOS,
+                            help='Запустить только эти сценарии.')
+        parser.add_argument('--username', default='bench0',
+                            help='Пользователь для авторизованных запросов.')
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare',
+                            help='JSON предыдущего запуска для сравнения.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--asgi', action='store_true',
+                            help='Запросы через ASGI-обработчик.')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Одновременных запросов в режиме --asgi.')
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help='Задержка каждого SQL-запроса, мс: '
+                                 'имитация сетевой БД для SQLite.')
+
+    def add_latency(self, latency):
+        """
+        Задержка добавляется во все соединения, в том числе открытые
+        потоками пула асинхронных вьюх.
+        """
+        def delay(execute, sql, params, many, context):
+            time.sleep(latency / 1000)
+            return execute(sql, params, many, context)
+
+        def add_wrapper(sender, connection, **kwargs):
+            connection.execute_wrappers.append(delay)
+
+        connection_created.connect(add_wrapper, weak=False)
+        for existing in connections.all():
+            existing.execute_wrappers.append(delay)
+
+    def setup(self, username, asgi):
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            raise CommandError(
+                f'Пользователь {username} не найден, '
+                'запустите seed_benchmark.'
+            )
+        if asgi:
+            token, _ = Token.objects.get_or_create(user=user)
+            self.anonymous = AsyncClient()
+            self.client = TokenAsyncClient(token.key)
+        else:
+            self.anonymous = APIClient()
+            self.client = APIClient()
+            self.client.force_authenticate(user)
+        self.recipe_ids = list(
+            Recipe.objects.order_by('id').values_list('id', flat=True)[:5000]
+        )
+        if not self.recipe_ids:
+            raise CommandError('В базе нет рецептов.')
+        self.pages = max(min(len(self.recipe_ids) // 6, 50), 1)
+        self.ingredient_names = list(
+            Ingredient.objects.values_list('name', flat=True)[:1000]
+        )
+        self.payload = {
+            'text': 'Рецепт из бенчмарка.',
+            'cooking_time': 10,
+            'image': get_image(),
+            'tags': list(Tag.objects.values_list('id', flat=True)[:2]),
+            'ingredients': [
+                {'id': pk, 'amount': 100}
+                for pk in Ingredient.objects.values_list(
+                    'id', flat=True
+                )[:5]
+            ],
+        }
+
+    def recipes_anonymous(self):
+        return self.anonymous.get(
+            '/api/recipes/',
+            {'page': self.random.randint(1, self.pages), 'limit': 6}
+        )
+
+    def recipes_authenticated(self):
+        return self.client.get(
+            '/api/recipes/',
+            {'page': self.random.randint(1, self.pages), 'limit': 6}
+        )
+
+    def recipe_detail(self):
+        return self.client.get(
+            f'/api/recipes/{self.random.choice(self.recipe_ids)}/'
+        )
+
+    def subscriptions(self):
+        return self.client.get(
+            '/api/users/subscriptions/', {'recipes_limit': 3, 'limit': 6}
+        )
+
+    def download_shopping_cart(self):
+        return self.client.get('/api/recipes/download_shopping_cart/')
+
+    def ingredient_autocomplete(self):
+        name = self.random.choice(self.ingredient_names or ['а'])
+        return self.anonymous.get(
+            '/api/ingredients/',
+            {'name': name[:self.random.randint(1, 3)]}
+        )
+
+    def recipe_create(self):
+        """
+        Рецепт создается в транзакции, которая откатывается. Откат
+        не затрагивает хранилище, поэтому сохраненное изображение
+        удаляется до него.
+        """
+        with transaction.atomic():
+            try:
+                response = self.client.post(
+                    '/api/recipes/',
+                    dict(self.payload, name=f'Бенчмарк {uuid.uuid4().hex}'),
+                    format='json'
+                )
+                if response.status_code == 201:
+                    Recipe.objects.get(
+                        pk=response.data['id']
+                    ).image.delete(save=False)
+            finally:
+                transaction.set_rollback(True)
+        return response
+
+    def run_scenario(self, name, requests, warmup):
+        handler = getattr(self, name)
+        for _ in range(warmup):
+            handler()
+        timings, queries, statuses = [], [], {}
+        started = time.perf_counter()
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as context:
+                request_started = time.perf_counter()
+                response = handler()
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append(
+                    (time.perf_counter() - request_started) * 1000
+                )
+            queries.append(len(context))
+            statuses[response.status_code] = (
+                statuses.get(response.status_code, 0) + 1
+            )
+        return self.summarize(
+            timings, queries, statuses, time.perf_counter() - started
+        )
+
+    async def run_scenario_async(self, name, requests, warmup, concurrency):
+        """
+        Запросы через ASGI-обработчик, не больше concurrency
+        одновременно. SQL-запросы выполняются в других потоках
+        и не считаются.
+        """
+        handler = getattr(self, name)
+        for _ in range(warmup):
+            await handler()
+        timings, statuses = [], {}
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with semaphore:
+                request_started = time.perf_counter()
+                response = await handler()
+                if response.streaming:
+                    await sync_to_async(b''.join)(response.streaming_content)
+                timings.append(
+                    (time.perf_counter() - request_started) * 1000
+                )
+            statuses[response.status_code] = (
+                statuses.get(response.status_code, 0) + 1
+            )
+
+        started = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(requests)))
+        return self.summarize(
+            timings, None, statuses, time.perf_counter() - started
+        )
+
+    def summarize(self, timings, queries, statuses, elapsed):
+        return {
+            'requests': len(timings),
+            'statuses': {str(code): count
+                         for code, count in sorted(statuses.items())},
+            'throughput_rps': round(len(timings) / elapsed, 2),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p90_ms': round(percentile(timings, 90), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'max_ms': round(max(timings), 3),
+            'queries_median': percentile(queries, 50) if queries else None,
+            'queries_max': max(queries) if queries else None,
+        }
+
+    def compare(self, path, results):
+        previous = json.loads(Path(path).read_text(encoding='utf-8'))
+        self.stdout.write(
+            f'Сравнение с {previous.get("commit")} '
+            f'({previous.get("server", "wsgi")}, {path}):'
+        )
+        for name, current in results['scenarios'].items():
+            old = previous.get('scenarios', {}).get(name)
+            if old is None:
+                continue
+            changes = ', '.join(
+                '{0} {1:+.1f}%'.format(
+                    key, (current[key] - old[key]) / old[key] * 100
+                )
+                for key in ('p50_ms', 'p95_ms', 'throughput_rps')
+                if old[key]
+            )
+            if None not in (old['queries_median'],
+                            current['queries_median']):
+                changes += (
+                    f', запросов к БД {old["queries_median"]} -> '
+                    f'{current["queries_median"]}'
+                )
+            self.stdout.write(f'  {name}: {changes}')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError(
+                '--requests и --concurrency должны быть больше нуля.'
+            )
+        scenarios = options['scenario'] or (
+            ASGI_SCENARIOS if options['asgi'] else SCENARIOS
+        )
+        if options['asgi'] and 'recipe_create' in scenarios:
+            raise CommandError('recipe_create недоступен в режиме --asgi.')
+        self.random = random.Random(options['seed'])
+        self.setup(options['username'], options['asgi'])
+        if options['db_latency']:
+            self.add_latency(options['db_latency'])
+        results = {
+            'commit': get_commit(),
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'server': 'asgi' if options['asgi'] else 'wsgi',
+            'async_views': options['asgi'] and settings.ASYNC_VIEWS['ENABLED'],
+            'concurrency': options['concurrency'] if options['asgi'] else 1,
+            'db_latency_ms': options['db_latency'],
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredient_recipes': IngredientRecipe.objects.count(),
+            },
+            'scenarios': {},
+        }
+        for name in scenarios:
+            if options['asgi']:
+                result = asyncio.run(self.run_scenario_async(
+                    name, options['requests'], options['warmup'],
+                    options['concurrency']
+                ))
+            else:
+                result = self.run_scenario(
+                    name, options['requests'], options['warmup']
+                )
+            results['scenarios'][name] = result
+            self.stdout.write(
+                f'{name}: p50 {result["p50_ms"]} мс, '
+                f'p95 {result["p95_ms"]} мс, '
+                f'{result["throughput_rps"]} rps, '
+                f'запросов к БД {result["queries_median"]}'
+            )
+        Path(options['output']).write_text(
+            json.dumps(results, ensure_ascii=False, indent=2),
+            encoding='utf-8'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты записаны в {options["output"]}'
+        ))
+        if options['compare']:
+            self.compare(options['compare'], results)
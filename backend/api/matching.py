@@ -0,0 +1,202 @@
+import heapq
+import logging
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.db import connection, transaction
+from recipes.models import IngredientRecipe
+from api.cache import reference_cache
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = 'recipe_ingredients'
+SEQUENCE_KEY = 'recipe_ingredients:sequence'
+CHANGES_KEY = 'recipe_ingredients:changes:{sequence}'
+CHANGES_TIMEOUT = 24 * 60 * 60
+# Больше изменений за раз дешевле применить полной перестройкой
+MAX_CHANGES = 1000
+
+
+class IngredientIndex:
+    """
+    Инвертированный индекс "ингредиент -> рецепты" в памяти процесса.
+    Списки id рецептов хранятся отсортированными массивами array('q').
+    Изменения после коммита транзакции записываются в журнал с номерами
+    в кеше reference_cache, и каждый процесс применяет новые записи
+    журнала к своему индексу при следующем обращении. Для нескольких
+    воркеров кеш должен быть общим (см. REFERENCE_CACHE в settings).
+    Полная перестройка нужна при первом обращении, после
+    invalidate(NAMESPACE) (массовая загрузка данных) и при разрыве
+    журнала; кроме первой, она идет в фоновом потоке, а запросы до ее
+    окончания используют прежний индекс.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._recipes = defaultdict(lambda: array('q'))
+        self._ingredients = defaultdict(lambda: array('q'))
+        self._rebuilding = False
+        self.version = None
+        self.sequence = 0
+
+    @property
+    def backend(self):
+        return reference_cache.backend
+
+    def get_sequence(self):
+        return self.backend.get(SEQUENCE_KEY, 0)
+
+    def _add(self, recipe_id, ingredient_id):
+        recipes = self._recipes[ingredient_id]
+        position = bisect_left(recipes, recipe_id)
+        if position == len(recipes) or recipes[position] != recipe_id:
+            recipes.insert(position, recipe_id)
+            insort(self._ingredients[recipe_id], ingredient_id)
+
+    def _remove(self, recipe_id, ingredient_id):
+        for index, key, value in (
+            (self._recipes, ingredient_id, recipe_id),
+            (self._ingredients, recipe_id, ingredient_id),
+        ):
+            values = index.get(key)
+            if values is None:
+                continue
+            position = bisect_left(values, value)
+            if position < len(values) and values[position] == value:
+                del values[position]
+            if not values:
+                del index[key]
+
+    def rebuild(self):
+        """
+        Строит индекс заново одним запросом, не блокируя поиск по
+        прежнему. Записи журнала, появившиеся во время построения,
+        применяются повторно при следующем обращении: _add и _remove
+        идемпотентны.
+        """
+        version = reference_cache.get_version(NAMESPACE)
+        sequence = self.get_sequence()
+        recipes = defaultdict(lambda: array('q'))
+        ingredients = defaultdict(lambda: array('q'))
+        rows = IngredientRecipe.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).order_by('recipe_id', 'ingredient_id')
+        for recipe_id, ingredient_id in rows.iterator(chunk_size=10000):
+            recipes[ingredient_id].append(recipe_id)
+            ingredients[recipe_id].append(ingredient_id)
+        with self._lock:
+            self._recipes, self._ingredients = recipes, ingredients
+            self.version, self.sequence = version, sequence
+
+    def rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def run():
+            try:
+                self.rebuild()
+            except Exception:
+                logger.exception('Не удалось перестроить индекс ингредиентов')
+            finally:
+                with self._lock:
+                    self._rebuilding = False
+                connection.close()
+
+        threading.Thread(
+            target=run, name='ingredient-index', daemon=True
+        ).start()
+
+    def catch_up(self, sequence):
+        """Применяет журнал до sequence; False, если в журнале разрыв."""
+        keys = [
+            CHANGES_KEY.format(sequence=number)
+            for number in range(self.sequence + 1, sequence + 1)
+        ]
+        changes = self.backend.get_many(keys)
+        if len(changes) != len(keys):
+            return False
+        with self._lock:
+            for key in keys:
+                added, removed = changes[key]
+                for pair in removed:
+                    self._remove(*pair)
+                for pair in added:
+                    self._add(*pair)
+            self.sequence = max(self.sequence, sequence)
+        return True
+
+    def ensure_fresh(self):
+        if self.version is None:
+            with self._lock:
+                if self.version is None:
+                    self.rebuild()
+            return
+        if self.version != reference_cache.get_version(NAMESPACE):
+            self.rebuild_in_background()
+            return
+        sequence = self.get_sequence()
+        if sequence == self.sequence:
+            return
+        if (sequence < self.sequence
+                or sequence - self.sequence > MAX_CHANGES
+                or not self.catch_up(sequence)):
+            self.rebuild_in_background()
+
+    def apply(self, added=(), removed=()):
+        """
+        Записывает изменения пар (recipe_id, ingredient_id) в журнал
+        после коммита транзакции.
+        """
+        added, removed = list(added), list(removed)
+        if not added and not removed:
+            return
+
+        def update():
+            self.backend.add(SEQUENCE_KEY, 0, None)
+            sequence = self.backend.incr(SEQUENCE_KEY)
+            self.backend.set(
+                CHANGES_KEY.format(sequence=sequence),
+                (added, removed),
+                CHANGES_TIMEOUT
+            )
+
+        transaction.on_commit(update)
+
+    def match(self, ingredient_ids, limit):
+        """
+        Топ рецептов по доле имеющихся ингредиентов.
+        Возвращает список (recipe_id, доля, [id недостающих ингредиентов]).
+        """
+        self.ensure_fresh()
+        available = set(ingredient_ids)
+        with self._lock:
+            matched = Counter()
+            for ingredient_id in available:
+                matched.update(self._recipes.get(ingredient_id, ()))
+            best = heapq.nlargest(
+                limit,
+                matched.items(),
+                key=lambda item: (
+                    item[1] / len(self._ingredients[item[0]]),
+                    item[1],
+                    item[0],
+                )
+            )
+            return [
+                (
+                    recipe_id,
+                    count / len(self._ingredients[recipe_id]),
+                    [
+                        ingredient_id
+                        for ingredient_id in self._ingredients[recipe_id]
+                        if ingredient_id not in available
+                    ],
+                )
+                for recipe_id, count in best
+            ]
+
+
+ingredient_index = IngredientIndex()
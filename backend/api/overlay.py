@@ -0,0 +1,230 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import CharField, Prefetch, Value
+from django.http import Http404
+from recipes.models import Favorite, IngredientRecipe, Recipe, ShoppingCart
+from rest_framework.response import Response
+from users.models import Subscribers
+from api.cache import response_cache
+from api.serializers import GetRecipeSerializer
+
+FRAGMENT_KEY = 'fragment:recipe:{host}:{pk}'
+STATE_KEY = 'user:{user_id}:{state}'
+
+
+class UserStateCache:
+    """
+    Множества id для флагов пользователя: избранные рецепты, рецепты
+    в списке покупок и авторы, на которых он подписан. Сбрасываются
+    сигналами после коммита изменений.
+    """
+    states = {
+        'favorites': (Favorite, 'recipe_id'),
+        'cart': (ShoppingCart, 'recipe_id'),
+        'subscriptions': (Subscribers, 'author_id'),
+    }
+
+    def __init__(self, timeout, cache_alias):
+        self.timeout = timeout
+        self.cache_alias = cache_alias
+
+    @property
+    def backend(self):
+        return caches[self.cache_alias]
+
+    def get(self, user):
+        keys = {
+            STATE_KEY.format(user_id=user.pk, state=state): state
+            for state in self.states
+        }
+        found = self.backend.get_many(keys)
+        missing = {
+            state: key for key, state in keys.items() if key not in found
+        }
+        if missing:
+            loaded = self.load(user, missing)
+            self.backend.set_many(
+                {key: loaded[state] for state, key in missing.items()},
+                self.timeout
+            )
+            found.update(
+                (key, loaded[state]) for state, key in missing.items()
+            )
+        return {state: found[key] for key, state in keys.items()}
+
+    def load(self, user, states):
+        """Недостающие множества одним запросом UNION ALL."""
+        querysets = []
+        for state in states:
+            model, field = self.states[state]
+            querysets.append(model.objects.filter(user=user).annotate(
+                state=Value(state, output_field=CharField())
+            ).order_by().values_list('state', field))
+        values = {state: set() for state in states}
+        for state, value in querysets[0].union(*querysets[1:], all=True):
+            values[state].add(value)
+        return {state: frozenset(ids) for state, ids in values.items()}
+
+    def invalidate(self, user_id, state):
+        key = STATE_KEY.format(user_id=user_id, state=state)
+        transaction.on_commit(lambda: self.backend.delete(key))
+
+
+class RecipeFragmentCache:
+    """
+    Общая для всех пользователей часть ответа GetRecipeSerializer.
+    Фрагмент хранит версии ключей response_cache, от которых зависит
+    ('recipe:<id>', 'author:<id>', 'tags', 'ingredients'), и
+    считается устаревшим, если любая из них изменилась.
+    """
+    def __init__(self, timeout, cache_alias):
+        self.timeout = timeout
+        self.cache_alias = cache_alias
+
+    @property
+    def backend(self):
+        return caches[self.cache_alias]
+
+    def get_keys(self, request, ids):
+        host = hashlib.md5(
+            request.build_absolute_uri('/').encode()
+        ).hexdigest()[:12]
+        return {FRAGMENT_KEY.format(host=host, pk=pk): pk for pk in ids}
+
+    def get_many(self, request, ids):
+        keys = self.get_keys(request, ids)
+        entries = self.backend.get_many(keys)
+        versions = response_cache.get_versions({
+            namespace
+            for entry in entries.values()
+            for namespace in entry['versions']
+        })
+        return {
+            keys[key]: entry['data']
+            for key, entry in entries.items()
+            if all(
+                versions[namespace] == version
+                for namespace, version in entry['versions'].items()
+            )
+        }
+
+    def set_many(self, request, fragments, versions):
+        """
+        versions - версии рецептов и справочников, прочитанные до
+        загрузки рецептов из БД; версии авторов читаются здесь.
+        """
+        versions = dict(versions, **response_cache.get_versions(
+            f'author:{data["author"]["id"]}' for data in fragments.values()
+        ))
+        keys = self.get_keys(request, fragments)
+        self.backend.set_many({
+            key: {
+                'data': fragments[pk],
+                'versions': {
+                    namespace: versions[namespace]
+                    for namespace in (
+                        f'recipe:{pk}',
+                        f'author:{fragments[pk]["author"]["id"]}',
+                        'tags',
+                        'ingredients',
+                    )
+                },
+            }
+            for key, pk in keys.items()
+        }, self.timeout)
+
+
+user_state = UserStateCache(
+    timeout=settings.RECIPE_OVERLAY['STATE_TIMEOUT'],
+    cache_alias=settings.RECIPE_OVERLAY['CACHE_ALIAS'],
+)
+recipe_fragments = RecipeFragmentCache(
+    timeout=settings.RECIPE_OVERLAY['FRAGMENT_TIMEOUT'],
+    cache_alias=settings.RECIPE_OVERLAY['CACHE_ALIAS'],
+)
+
+
+def apply_overlay(fragment, state):
+    """Флаги пользователя поверх общего фрагмента рецепта."""
+    if state is None:
+        return fragment
+    data = dict(fragment)
+    data['is_favorited'] = data['id'] in state['favorites']
+    data['is_in_shopping_cart'] = data['id'] in state['cart']
+    data['author'] = dict(
+        data['author'],
+        is_subscribed=data['author']['id'] in state['subscriptions']
+    )
+    return data
+
+
+class RecipeOverlayMixin:
+    """
+    Миксин для list/retrieve рецептов. Из БД выбираются только id
+    страницы, тела рецептов берутся из recipe_fragments, а флаги
+    is_favorited/is_in_shopping_cart/is_subscribed подставляются
+    по множествам из user_state.
+    """
+    def list(self, request, *args, **kwargs):
+        if not settings.RECIPE_OVERLAY['ENABLED']:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(Recipe.objects.only('id', 'pub_date'))
+        page = self.paginate_queryset(queryset)
+        data = self.get_recipes_data(
+            [recipe.pk for recipe in (queryset if page is None else page)]
+        )
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not settings.RECIPE_OVERLAY['ENABLED']:
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            pk = int(self.kwargs[lookup_url_kwarg])
+        except ValueError:
+            raise Http404
+        data = self.get_recipes_data([pk])
+        if not data:
+            raise Http404
+        return Response(data[0])
+
+    def build_fragments(self, ids):
+        versions = response_cache.get_versions(
+            [f'recipe:{pk}' for pk in ids] + ['tags', 'ingredients']
+        )
+        recipes = list(Recipe.objects.filter(pk__in=ids).select_related(
+            'author'
+        ).prefetch_related('tags', Prefetch(
+            'recipe_ingredient',
+            queryset=IngredientRecipe.objects.select_related('ingredient')
+        )))
+        for recipe in recipes:
+            recipe.is_favorited = None
+            recipe.is_in_shopping_cart = None
+            recipe.author.is_subscribed = False
+        fragments = {
+            data['id']: data
+            for data in GetRecipeSerializer(
+                recipes, many=True, context={'request': self.request}
+            ).data
+        }
+        if fragments:
+            recipe_fragments.set_many(self.request, fragments, versions)
+        return fragments
+
+    def get_recipes_data(self, ids):
+        fragments = recipe_fragments.get_many(self.request, ids)
+        missing = [pk for pk in ids if pk not in fragments]
+        if missing:
+            fragments.update(self.build_fragments(missing))
+        user = self.request.user
+        state = user_state.get(user) if user.is_authenticated else None
+        return [
+            apply_overlay(fragments[pk], state)
+            for pk in ids if pk in fragments
+        ]
@@ -1,6 +1,39 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomPaginator(PageNumberPagination):
     """Кастомный пагинатор."""
     page_size_query_param = 'limit'
+
+
+class CursorPaginator(CursorPagination):
+    """
+    Keyset-пагинация без OFFSET и COUNT(*): страница N стоит
+    столько же, сколько первая. Поле count в ответе отсутствует.
+    Порядок берется из атрибута вьюсета cursor_ordering.
+    """
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
+
+
+class CursorPaginationMixin:
+    """
+    Миксин для вьюсетов: ?pagination=cursor (или наличие параметра
+    cursor из ссылок next/previous) включает CursorPaginator
+    вместо pagination_class.
+    """
+    cursor_pagination_class = CursorPaginator
+    cursor_ordering = ('-pub_date', '-id')
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if (params.get('pagination') == 'cursor'
+                    or self.cursor_pagination_class.cursor_query_param
+                    in params):
+                self._paginator = self.cursor_pagination_class()
+        return super().paginator
@@ -0,0 +1,213 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+_current_profile = contextvars.ContextVar('request_profile', default=None)
+
+
+class QueryBudgetError(Exception):
+    """Эндпоинт выполнил больше SQL-запросов, чем разрешено бюджетом."""
+
+
+class RequestProfile:
+    """
+    Метрики одного запроса. Экземпляр подключается ко всем соединениям
+    через connection.execute_wrapper и считает запросы и время в БД.
+    """
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.endpoint = None
+        self.serializer_time = 0.0
+        self._view_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    def start_view(self, endpoint):
+        self.endpoint = endpoint
+        self._view_started = (time.perf_counter(), self.db_time)
+
+    def stop_view(self):
+        """
+        Время Python-кода обработчика без учета SQL. Для вьюсетов API
+        это почти целиком сериализация ответа.
+        """
+        if self._view_started is None:
+            return
+        started, db_time = self._view_started
+        self.serializer_time = (
+            time.perf_counter() - started - (self.db_time - db_time)
+        )
+        self._view_started = None
+
+
+def get_profile():
+    return _current_profile.get()
+
+
+@contextmanager
+def track_queries(profile):
+    """
+    Подключает профиль к соединениям текущего потока, если он еще
+    не подключен (под ASGI вьюхи работают не в потоке middleware).
+    """
+    with ExitStack() as stack:
+        for connection in connections.all():
+            if profile not in connection.execute_wrappers:
+                stack.enter_context(connection.execute_wrapper(profile))
+        yield
+
+
+class EndpointMetrics:
+    """Агрегированные по эндпоинтам метрики текущего процесса."""
+    FIELDS = ('requests', 'queries', 'max_queries', 'db_seconds',
+              'serializer_seconds', 'total_seconds', 'response_bytes')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = defaultdict(lambda: dict.fromkeys(self.FIELDS, 0))
+
+    def record(self, profile, total_time, size):
+        with self._lock:
+            entry = self._endpoints[profile.endpoint]
+            entry['requests'] += 1
+            entry['queries'] += profile.queries
+            entry['max_queries'] = max(entry['max_queries'], profile.queries)
+            entry['db_seconds'] += profile.db_time
+            entry['serializer_seconds'] += profile.serializer_time
+            entry['total_seconds'] += total_time
+            entry['response_bytes'] += size
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                endpoint: dict(entry)
+                for endpoint, entry in sorted(self._endpoints.items())
+            }
+
+    def clear(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+metrics = EndpointMetrics()
+
+
+def check_budget(profile):
+    """
+    Сравнивает число запросов с бюджетом эндпоинта из
+    PROFILING['QUERY_BUDGETS'] (или DEFAULT_QUERY_BUDGET).
+    """
+    budget = settings.PROFILING['QUERY_BUDGETS'].get(
+        profile.endpoint, settings.PROFILING['DEFAULT_QUERY_BUDGET']
+    )
+    if budget is None or profile.queries <= budget:
+        return
+    message = '{0}: {1} SQL-запросов при бюджете {2}'.format(
+        profile.endpoint, profile.queries, budget
+    )
+    if settings.PROFILING['RAISE_ON_BUDGET']:
+        raise QueryBudgetError(message)
+    logger.warning(message)
+
+
+def server_timing(profile, total_time):
+    return (
+        'db;dur={0:.1f};desc="{1} queries", '
+        'serializer;dur={2:.1f}, total;dur={3:.1f}'
+    ).format(
+        profile.db_time * 1000,
+        profile.queries,
+        profile.serializer_time * 1000,
+        total_time * 1000
+    )
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    """
+    Считает SQL-запросы, время в БД, время сериализации и размер ответа
+    для вьюсетов с ProfilingMixin, добавляет заголовок Server-Timing
+    и проверяет бюджет запросов. Включается PROFILING_ENABLED=True.
+    Запросы, выполненные при отдаче StreamingHttpResponse,
+    не учитываются.
+    """
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not settings.PROFILING['ENABLED']:
+            return self.get_response(request)
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with track_queries(profile):
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(profile, response, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        """Под ASGI запросы к БД считает ProfilingMixin в потоке вьюхи."""
+        if not settings.PROFILING['ENABLED']:
+            return await self.get_response(request)
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(profile, response, time.perf_counter() - started)
+
+    def finish(self, profile, response, total_time):
+        if profile.endpoint is None:
+            return response
+        size = 0 if response.streaming else len(response.content)
+        metrics.record(profile, total_time, size)
+        response['Server-Timing'] = server_timing(profile, total_time)
+        check_budget(profile)
+        return response
+
+
+class ProfilingMixin:
+    """
+    Миксин для вьюсетов: сообщает ProfilingMiddleware имя эндпоинта
+    ('<Вьюсет>.<action>') и время работы обработчика.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        profile = get_profile()
+        if profile is None:
+            return super().dispatch(request, *args, **kwargs)
+        with track_queries(profile):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        profile = get_profile()
+        if profile is not None:
+            profile.start_view('{0}.{1}'.format(
+                self.__class__.__name__,
+                getattr(self, 'action', None) or request.method.lower()
+            ))
+        super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        profile = get_profile()
+        if profile is not None:
+            profile.stop_view()
+        return super().finalize_response(request, response, *args, **kwargs)
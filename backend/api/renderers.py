@@ -0,0 +1,145 @@
+import csv
+import io
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingCartNegotiation(DefaultContentNegotiation):
+    """
+    Выбор формата списка покупок только по параметру ?format=.
+    Без параметра отдается первый рендерер (txt), заголовок Accept
+    не учитывается.
+    """
+    def select_renderer(self, request, renderers, format_suffix=None):
+        format_query_param = self.settings.URL_FORMAT_OVERRIDE
+        format = format_suffix or request.query_params.get(format_query_param)
+        if format:
+            renderers = self.filter_renderers(renderers, format)
+        renderer = renderers[0]
+        return renderer, renderer.media_type
+
+
+class TxtShoppingCartRenderer(BaseRenderer):
+    """Список покупок в виде текстового файла."""
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def stream(self, ingredients):
+        """Генератор строк файла для StreamingHttpResponse."""
+        for item in ingredients:
+            yield (f'{item["name"]} - {item["total_amount"]} '
+                   f'({item["measurement_unit"]})\n')
+
+    def get_error_lines(self, data):
+        """Строки ошибки, которую вьюсет вернул в этом формате."""
+        if isinstance(data, dict):
+            return [f'{key}: {value}' for key, value in data.items()]
+        return [str(data)]
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return ''.join(
+            f'{line}\n' for line in self.get_error_lines(data)
+        ).encode(self.charset)
+
+
+class CSVShoppingCartRenderer(TxtShoppingCartRenderer):
+    """Список покупок в формате CSV."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(('name', 'measurement_unit', 'amount'))
+        for item in ingredients:
+            writer.writerow(
+                (item['name'], item['measurement_unit'], item['total_amount'])
+            )
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+
+class PDFShoppingCartRenderer(TxtShoppingCartRenderer):
+    """
+    Список покупок в формате PDF.
+    Документ собирается в памяти целиком и отдается частями.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingCartFont'
+    font_size = 12
+    chunk_size = 64 * 1024
+
+    def get_font(self):
+        """
+        Шрифт с кириллицей из SHOPPING_CART_PDF_FONT. Встроенные шрифты
+        PDF (Helvetica и др.) кириллицу не содержат, поэтому замены нет.
+        """
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.SHOPPING_CART_PDF_FONT)
+            )
+        return self.font_name
+
+    def build(self, lines):
+        buffer = io.BytesIO()
+        page = canvas.Canvas(buffer, pagesize=A4)
+        _, height = A4
+        font = self.get_font()
+        top = height - 50
+        y = top
+        page.setFont(font, self.font_size)
+        for line in lines:
+            if y < 50:
+                page.showPage()
+                page.setFont(font, self.font_size)
+                y = top
+            page.drawString(50, y, line.rstrip('\n'))
+            y -= self.font_size * 1.5
+        page.save()
+        return buffer.getvalue()
+
+    def stream(self, ingredients):
+        content = self.build(super().stream(ingredients))
+        for start in range(0, len(content), self.chunk_size):
+            yield content[start:start + self.chunk_size]
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return self.build(self.get_error_lines(data))
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Метрики эндпоинтов в текстовом формате Prometheus."""
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+    metrics = (
+        ('requests', 'foodgram_requests_total', 'counter'),
+        ('queries', 'foodgram_db_queries_total', 'counter'),
+        ('max_queries', 'foodgram_db_queries_max', 'gauge'),
+        ('db_seconds', 'foodgram_db_seconds_total', 'counter'),
+        ('serializer_seconds', 'foodgram_serializer_seconds_total',
+         'counter'),
+        ('total_seconds', 'foodgram_request_seconds_total', 'counter'),
+        ('response_bytes', 'foodgram_response_bytes_total', 'counter'),
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        lines = []
+        for field, name, metric_type in self.metrics:
+            lines.append(f'# TYPE {name} {metric_type}')
+            for endpoint, values in data.items():
+                if isinstance(values, dict) and field in values:
+                    lines.append(
+                        f'{name}{{endpoint="{endpoint}"}} {values[field]}'
+                    )
+        return ''.join(f'{line}\n' for line in lines).encode(self.charset)
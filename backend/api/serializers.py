@@ -1,16 +1,27 @@
 import base64
+import binascii
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import transaction
+from django.core.files.storage import default_storage
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework.exceptions import ValidationError
 from rest_framework.serializers import (
     ModelSerializer,
+    Field,
     ImageField,
     CharField,
+    FloatField,
+    IntegerField,
+    ListField,
+    ListSerializer,
     PrimaryKeyRelatedField,
+    Serializer,
     SerializerMethodField
 )
-from rest_framework.exceptions import ValidationError
+from recipes.feed import fan_out_recipe
+from recipes.images import schedule_recipe_image
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -20,6 +31,8 @@ from recipes.models import (
     Tag
 )
 from users.models import Subscribers, User
+from api.matching import ingredient_index
+from api.utils import change_counter, get_recipes_limit
 
 
 class UsersCreateSerializer(UserCreateSerializer):
@@ -67,6 +80,8 @@ class UserInfoSerializer(UserSerializer):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Subscribers.objects.filter(
             user=user,
             author=obj.id).exists()
@@ -75,7 +90,7 @@ class UserInfoSerializer(UserSerializer):
 class FollowSerializer(UserInfoSerializer):
     """Сериализатор для добавления/удаления подписки, просмотра подписок."""
     recipes = SerializerMethodField(read_only=True)
-    recipes_count = SerializerMethodField(read_only=True)
+    recipes_count = IntegerField(read_only=True)
 
     class Meta(UserInfoSerializer.Meta):
         fields = UserInfoSerializer.Meta.fields + ('recipes', 'recipes_count')
@@ -83,31 +98,129 @@ class FollowSerializer(UserInfoSerializer):
     def get_recipes(self, object):
         request = self.context.get('request')
         context = {'request': request}
-        recipe_limit = request.query_params.get('recipes_limit')
-        queryset = object.recipes.all()
-        if recipe_limit:
-            queryset = queryset[:int(recipe_limit)]
+        if hasattr(object, 'limited_recipes'):
+            queryset = object.limited_recipes
+        else:
+            queryset = object.recipes.all()
+            recipes_limit = get_recipes_limit(request)
+            if recipes_limit:
+                queryset = queryset[:recipes_limit]
         return RecipeInfoSerializer(
             queryset,
             context=context,
             many=True).data
 
-    def get_recipes_count(self, object):
-        return object.recipes.count()
-
 
 class Base64ImageField(ImageField):
-    """Кастомное поле для кодирования изображения в base64."""
+    """
+    Кастомное поле для кодирования изображения в base64.
+    Строка декодируется частями сразу во временный файл, размер
+    проверяется по ходу декодирования, а тип - по сигнатуре файла,
+    до того как изображение откроет Pillow.
+    """
+    chunk_size = 64 * 1024
+    signature_size = 12
+    signatures = {
+        'png': (b'\x89PNG\r\n\x1a\n',),
+        'jpeg': (b'\xff\xd8\xff',),
+        'jpg': (b'\xff\xd8\xff',),
+        'gif': (b'GIF87a', b'GIF89a'),
+        'webp': (b'RIFF',),
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(
-                base64.b64decode(imgstr),
-                name='temp.' + ext
-            )
+            data = self.decode(data)
         return super().to_internal_value(data)
 
+    def decode(self, data):
+        separator = data.find(';base64,')
+        if separator == -1:
+            raise ValidationError('Изображение должно быть в base64.')
+        ext = data[len('data:image/'):separator].lower()
+        if ext not in self.signatures:
+            raise ValidationError(f'Неподдерживаемый формат: {ext}.')
+        file = TemporaryUploadedFile('temp.' + ext, 'image/' + ext, 0, None)
+        try:
+            file.size = self.decode_chunks(
+                data, separator + len(';base64,'), ext, file
+            )
+        except binascii.Error:
+            file.close()
+            raise ValidationError('Некорректная строка base64.')
+        except ValidationError:
+            file.close()
+            raise
+        file.seek(0)
+        return file
+
+    def decode_chunks(self, data, start, ext, file):
+        """
+        Декодирует строку частями по chunk_size символов и пишет их
+        в file. Переносы строк MIME-base64 (RFC 2045) не значимы и
+        убираются в каждой части отдельно; остаток, не кратный четырем
+        символам, переносится в следующую. Размер проверяется по уже
+        декодированным байтам, поэтому слишком большое изображение
+        отклоняется, не дочитывая строку. Возвращает размер файла.
+        """
+        size, head, rest, padded = 0, b'', '', False
+        for position in range(start, len(data), self.chunk_size):
+            encoded = rest + ''.join(
+                data[position:position + self.chunk_size].split()
+            )
+            whole = len(encoded) - len(encoded) % 4
+            encoded, rest = encoded[:whole], encoded[whole:]
+            if not encoded:
+                continue
+            if padded:
+                raise binascii.Error('Данные после завершающего "=".')
+            chunk = base64.b64decode(encoded, validate=True)
+            padded = encoded.endswith('=')
+            if len(head) < self.signature_size:
+                head += chunk[:self.signature_size]
+                if len(head) >= self.signature_size:
+                    self.check_signature(head, ext)
+            size += len(chunk)
+            if size > settings.MAX_IMAGE_UPLOAD_SIZE:
+                raise ValidationError(
+                    'Размер изображения не должен превышать '
+                    f'{settings.MAX_IMAGE_UPLOAD_SIZE} байт.'
+                )
+            file.write(chunk)
+        if rest:
+            raise binascii.Error('Длина строки не кратна четырем.')
+        if len(head) < self.signature_size:
+            self.check_signature(head, ext)
+        return size
+
+    def check_signature(self, chunk, ext):
+        if not chunk.startswith(self.signatures[ext]):
+            raise ValidationError(
+                'Содержимое файла не соответствует типу изображения.'
+            )
+        if ext == 'webp' and chunk[8:12] != b'WEBP':
+            raise ValidationError(
+                'Содержимое файла не соответствует типу изображения.'
+            )
+
+
+class ImageVariantsField(Field):
+    """
+    Ссылки на уменьшенные копии изображения рецепта.
+    Пока фоновая обработка не завершена, возвращается пустой словарь.
+    """
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        kwargs.setdefault('source', 'image_variants')
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        return {
+            name: request.build_absolute_uri(default_storage.url(path))
+            for name, path in value.items()
+        }
+
 
 class TagSerializer(ModelSerializer):
     """Сериализатор для работы с тегами."""
@@ -157,15 +270,66 @@ class RecipeIngredientSerializer(ModelSerializer):
         )
 
 
+def get_objects_by_ids(queryset, ids):
+    """
+    Объекты по списку id одним запросом id__in.
+    Все несуществующие id перечисляются в одной ошибке.
+    """
+    objects = queryset.all().in_bulk(set(ids))
+    missing = sorted(set(ids) - objects.keys())
+    if missing:
+        raise ValidationError(
+            'Объекты с id {0} не найдены.'.format(
+                ', '.join(map(str, missing))
+            )
+        )
+    return [objects[pk] for pk in ids]
+
+
+class BulkPrimaryKeyRelatedField(ListField):
+    """
+    Список первичных ключей связанных объектов.
+    В отличие от PrimaryKeyRelatedField(many=True) проверяется
+    одним запросом, а не запросом на каждый id.
+    """
+    child = IntegerField(min_value=1)
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        return get_objects_by_ids(
+            self.queryset, super().to_internal_value(data)
+        )
+
+    def to_representation(self, value):
+        return [item.pk for item in value.all()]
+
+
+class AddIngredientListSerializer(ListSerializer):
+    """Проверяет id всех ингредиентов рецепта одним запросом."""
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = get_objects_by_ids(
+            Ingredient.objects.all(),
+            [item['ingredient'] for item in items]
+        )
+        for item, ingredient in zip(items, ingredients):
+            item['ingredient'] = ingredient
+        return items
+
+
 class AddIngredientSerializer(ModelSerializer):
     """Сериализатор для добавления ингредиента при создании рецепта."""
-    id = PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
+    id = IntegerField(
+        min_value=1,
         source='ingredient'
     )
 
     class Meta:
         model = IngredientRecipe
+        list_serializer_class = AddIngredientListSerializer
         fields = (
             'id',
             'amount'
@@ -180,6 +344,10 @@ class RecipeSerializer(ModelSerializer):
     author = UserInfoSerializer(read_only=True)
     image = Base64ImageField()
     ingredients = AddIngredientSerializer(many=True)
+    tags = BulkPrimaryKeyRelatedField(
+        queryset=Tag.objects.all(),
+        allow_empty=False
+    )
 
     class Meta:
         model = Recipe
@@ -195,7 +363,9 @@ class RecipeSerializer(ModelSerializer):
         )
 
     def validate(self, data):
-        list_ingr = [item['ingredient'] for item in data['ingredients']]
+        list_ingr = [
+            item['ingredient'] for item in data.get('ingredients', [])
+        ]
         all_ingredients, distinct_ingredients = (
             len(list_ingr), len(set(list_ingr)))
         if all_ingredients != distinct_ingredients:
@@ -211,7 +381,12 @@ class RecipeSerializer(ModelSerializer):
                 ingredient=ingredient.get('ingredient'),
                 amount=ingredient.get('amount')
             ) for ingredient in ingredients)
+        ingredient_index.apply(added=[
+            (recipe.id, ingredient['ingredient'].id)
+            for ingredient in ingredients
+        ])
 
+    @transaction.atomic
     def create(self, validated_data):
         user = self.context.get('request').user
         tags = validated_data.pop('tags')
@@ -220,27 +395,77 @@ class RecipeSerializer(ModelSerializer):
             author=user,
             **validated_data
         )
+        change_counter(User, user.id, 'recipes_count', 1)
         recipe.tags.set(tags)
         self.get_ingredients(recipe, ingredients)
+        fan_out_recipe(recipe)
+        schedule_recipe_image(recipe)
         return recipe
 
-    def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        IngredientRecipe.objects.filter(recipe=instance).delete()
-        instance.tags.set(tags)
-        self.get_ingredients(instance, ingredients)
-        return super().update(instance, validated_data)
+    def update_ingredients(self, recipe, ingredients):
+        """
+        Обновляет только изменившиеся строки IngredientRecipe:
+        bulk_update для новых количеств, bulk_create для новых
+        ингредиентов и один DELETE для удаленных. Сигналы при этом
+        не отправляются (у QuerySet.delete() с подключенными
+        получателями это SELECT, post_delete на каждую строку и DELETE),
+        поэтому индекс ингредиентов обновляется здесь же.
+        """
+        existing = {
+            item.ingredient_id: item
+            for item in IngredientRecipe.objects.filter(recipe=recipe)
+        }
+        changed, created = [], []
+        for item in ingredients:
+            ingredient, amount = item['ingredient'], item['amount']
+            current = existing.pop(ingredient.id, None)
+            if current is None:
+                created.append(IngredientRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=amount
+                ))
+            elif current.amount != amount:
+                current.amount = amount
+                changed.append(current)
+        if existing:
+            # На IngredientRecipe нет внешних ключей, каскад не нужен
+            IngredientRecipe.objects.filter(
+                id__in=[item.id for item in existing.values()]
+            )._raw_delete(IngredientRecipe.objects.db)
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ['amount'])
+        if created:
+            IngredientRecipe.objects.bulk_create(created)
+        ingredient_index.apply(
+            added=[(recipe.id, item.ingredient_id) for item in created],
+            removed=[(recipe.id, ingredient) for ingredient in existing]
+        )
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        if 'image' in validated_data:
+            validated_data['image_variants'] = {}
         instance = super().update(instance, validated_data)
-        instance.tags().clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.get_ingredients(recipe=instance,
-                             ingredients=ingredients)
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+        if 'image' in validated_data:
+            schedule_recipe_image(instance)
+        return instance
+
+    def save(self, **kwargs):
+        """
+        Временный файл изображения закрывается сразу после сохранения:
+        хранилище уже переместило его в MEDIA_ROOT.
+        """
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
 
     def to_representation(self, instance):
         context = {'request': self.context.get('request')}
@@ -258,6 +483,7 @@ class GetRecipeSerializer(ModelSerializer):
     )
     is_favorited = SerializerMethodField(read_only=True)
     is_in_shopping_cart = SerializerMethodField(read_only=True)
+    images = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -270,13 +496,17 @@ class GetRecipeSerializer(ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'images',
             'text',
             'cooking_time',
+            'favorites_count',
         )
 
     def get_is_favorited(self, obj):
         user = self.context['request'].user
         if user.is_authenticated:
+            if hasattr(obj, 'is_favorited'):
+                return obj.is_favorited
             try:
                 obj.favorite.get(user=user)
                 return True
@@ -286,6 +516,8 @@ class GetRecipeSerializer(ModelSerializer):
     def get_is_in_shopping_cart(self, obj):
         user = self.context['request'].user
         if user.is_authenticated:
+            if hasattr(obj, 'is_in_shopping_cart'):
+                return obj.is_in_shopping_cart
             try:
                 obj.shopping_cart.get(user=user)
                 return True
@@ -293,41 +525,35 @@ class GetRecipeSerializer(ModelSerializer):
                 return False
 
 
-class FavoriteSerializer(ModelSerializer):
-    """Сериализатор добавления/удаления рецепта в избранное."""
-    class Meta:
-        model = Favorite
-        fields = (
-            'user',
-            'recipe'
-        )
-
-    def validate(self, data):
-        user, recipe = data['user'], data.get('recipe')
-        if self.Meta.model.objects.filter(user=user, recipe=recipe).exists():
-            raise ValidationError(
-                {'error': 'Этот рецепт уже добавлен'}
-            )
-        return data
-
-    def to_representation(self, instance):
-        context = {'request': self.context.get('request')}
-        return RecipeInfoSerializer(instance.recipe, context=context).data
-
-
-class ShoppingCartSerializer(FavoriteSerializer):
-    """Сериализатор добавления/удаления рецепта в список покупок."""
-    class Meta(FavoriteSerializer.Meta):
-        model = ShoppingCart
-
-
 class RecipeInfoSerializer(ModelSerializer):
     """Сериализатор для отображения краткой информации о рецепте."""
+    images = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = (
             'id',
             'name',
             'image',
+            'images',
             'cooking_time'
         )
+
+
+class RecipeMatchSerializer(Serializer):
+    """Рецепт, подобранный по имеющимся ингредиентам."""
+    recipe = RecipeInfoSerializer()
+    match_ratio = FloatField()
+    missing_ingredients = IngredientSerializer(many=True)
+
+
+class RecipeIdsSerializer(Serializer):
+    """Список id рецептов для массового добавления/удаления."""
+    recipes = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
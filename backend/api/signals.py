@@ -0,0 +1,87 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag
+)
+from recipes.images import variants_saved
+from users.models import Subscribers, User
+from api.cache import reference_cache, response_cache
+from api.overlay import user_state
+from api.matching import ingredient_index
+from api.utils import relations_changed
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    reference_cache.invalidate('tags')
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredients(sender, **kwargs):
+    reference_cache.invalidate('ingredients')
+
+
+@receiver(post_save, sender=IngredientRecipe)
+def index_recipe_ingredient(sender, instance, created, **kwargs):
+    if created:
+        ingredient_index.apply(
+            added=[(instance.recipe_id, instance.ingredient_id)]
+        )
+
+
+@receiver(post_delete, sender=IngredientRecipe)
+def unindex_recipe_ingredient(sender, instance, **kwargs):
+    ingredient_index.apply(
+        removed=[(instance.recipe_id, instance.ingredient_id)]
+    )
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def invalidate_recipe_responses(sender, instance, **kwargs):
+    response_cache.invalidate(f'recipe:{instance.pk}', 'recipes')
+
+
+@receiver(variants_saved, sender=Recipe)
+def invalidate_recipe_images(sender, recipe_id, **kwargs):
+    response_cache.invalidate(f'recipe:{recipe_id}', 'recipes')
+
+
+def invalidate_relations(model, user_id, target_ids):
+    """
+    Сброс кешей после изменения связей пользователя: флаги
+    пользователя и, для избранного и списка покупок, ответы со
+    счетчиками рецептов.
+    """
+    for state, (state_model, _) in user_state.states.items():
+        if state_model is model:
+            user_state.invalidate(user_id, state)
+    if model is not Subscribers:
+        response_cache.invalidate(*(f'recipe:{pk}' for pk in target_ids))
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=ShoppingCart)
+def invalidate_recipe_relation(sender, instance, **kwargs):
+    invalidate_relations(sender, instance.user_id, [instance.recipe_id])
+
+
+@receiver([post_save, post_delete], sender=Subscribers)
+def invalidate_subscriptions(sender, instance, **kwargs):
+    invalidate_relations(sender, instance.user_id, [instance.author_id])
+
+
+@receiver(relations_changed)
+def invalidate_changed_relations(sender, user_id, target_ids, **kwargs):
+    invalidate_relations(sender, user_id, target_ids)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_responses(sender, instance, update_fields, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    response_cache.invalidate(f'author:{instance.pk}')
@@ -0,0 +1,76 @@
+import base64
+import io
+
+from django.core.cache import cache
+from PIL import Image
+from rest_framework.test import APIClient
+from api.cache import reference_cache
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from users.models import User
+
+
+def image_bytes(size=(400, 300)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def image_data():
+    return 'data:image/png;base64,' + base64.b64encode(image_bytes()).decode()
+
+
+class RecipesDataMixin:
+    """Пользователи, теги, ингредиенты и рецепты для тестов API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{number}',
+                email=f'user{number}@foodgram.ru',
+                password='password',
+                first_name='Имя',
+                last_name='Фамилия'
+            )
+            for number in range(3)
+        ]
+        cls.user = cls.users[0]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', color='#E26C2D', slug=f'tag{number}'
+            )
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(5)
+        ]
+        cls.recipes = []
+        for number in range(6):
+            recipe = Recipe.objects.create(
+                author=cls.users[number % 3],
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10,
+                image='recipes/images/recipe.png'
+            )
+            recipe.tags.set(cls.tags[:number % 3 + 1])
+            IngredientRecipe.objects.bulk_create([
+                IngredientRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=100
+                )
+                for ingredient in cls.ingredients[:number % 5 + 1]
+            ])
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        self.clear_caches()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def clear_caches(self):
+        cache.clear()
+        reference_cache.clear()
@@ -0,0 +1,67 @@
+from django.test import TestCase
+from api.tests.base import RecipesDataMixin
+from api.utils import change_relations, change_relations_orm
+from recipes.models import Favorite, Recipe
+
+URL = '/api/recipes/favorite/bulk/'
+
+
+class FavoriteBulkTest(RecipesDataMixin, TestCase):
+    """Счетчики избранного меняются только для измененных строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.favorite = cls.recipes[0]
+        Favorite.objects.create(user=cls.user, recipe=cls.favorite)
+        Recipe.objects.filter(pk=cls.favorite.pk).update(favorites_count=1)
+
+    def get_counts(self):
+        return dict(Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in self.recipes]
+        ).values_list('pk', 'favorites_count'))
+
+    def test_add_with_existing_favorite(self):
+        ids = [recipe.pk for recipe in self.recipes[:3]] + [10 ** 6]
+        response = self.client.post(URL, {'recipes': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['exists', 'added', 'added', 'not_found']
+        )
+        counts = self.get_counts()
+        for recipe in self.recipes[:3]:
+            self.assertEqual(counts[recipe.pk], 1)
+        self.assertEqual(
+            Favorite.objects.filter(user=self.user).count(), 3
+        )
+
+    def assert_existing_not_counted(self, function):
+        ids = [recipe.pk for recipe in self.recipes[:3]]
+        changed = function(
+            Favorite, self.user.id, 'recipe', ids, 'favorites_count', True
+        )
+        self.assertEqual(changed, set(ids[1:]))
+        counts = self.get_counts()
+        for pk in ids:
+            self.assertEqual(counts[pk], 1)
+
+    def test_concurrent_existing_favorite(self):
+        """Строка, вставленная после проверки состояния, не считается."""
+        self.assert_existing_not_counted(change_relations)
+
+    def test_concurrent_existing_favorite_orm(self):
+        self.assert_existing_not_counted(change_relations_orm)
+
+    def test_remove(self):
+        ids = [recipe.pk for recipe in self.recipes[:2]]
+        response = self.client.delete(URL, {'recipes': ids}, format='json')
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['removed', 'absent']
+        )
+        changed = change_relations(
+            Favorite, self.user.id, 'recipe', ids, 'favorites_count', False
+        )
+        self.assertEqual(changed, set())
+        self.assertEqual(set(self.get_counts().values()), {0})
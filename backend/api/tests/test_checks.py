@@ -0,0 +1,41 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+from api.checks import check_shared_cache, check_worker_caches
+
+REDIS = {'default': {
+    'BACKEND': 'django_redis.cache.RedisCache',
+    'LOCATION': 'redis://redis:6379/0',
+}}
+
+
+class WorkerCachesTest(SimpleTestCase):
+    """Несколько воркеров допускаются только с общим кешем."""
+
+    def test_single_worker_with_local_cache(self):
+        with override_settings(WEB_CONCURRENCY=1):
+            check_worker_caches()
+        self.assertEqual(
+            [warning.id for warning in check_shared_cache(None)],
+            ['api.W001']
+        )
+
+    @override_settings(WEB_CONCURRENCY=3)
+    def test_workers_with_local_cache_refused(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'REDIS_URL'):
+            check_worker_caches()
+
+    @override_settings(WEB_CONCURRENCY=3, CACHES=REDIS)
+    def test_workers_with_shared_cache(self):
+        check_worker_caches()
+        self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(
+        WEB_CONCURRENCY=3,
+        CACHES=dict(REDIS, local={
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }),
+        RECIPE_OVERLAY={'ENABLED': True, 'CACHE_ALIAS': 'local'}
+    )
+    def test_overlay_on_local_alias_refused(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'local'):
+            check_worker_caches()
@@ -0,0 +1,67 @@
+from django.test import TestCase
+from api.tests.base import RecipesDataMixin, image_data
+from api.utils import change_counter, change_counters
+from recipes.models import Recipe
+from users.models import User
+
+
+class ChangeCounterTest(RecipesDataMixin, TestCase):
+    """Атомарное изменение денормализованных счетчиков."""
+
+    def get_counts(self, recipes, field='favorites_count'):
+        return [
+            getattr(Recipe.objects.get(pk=recipe.pk), field)
+            for recipe in recipes
+        ]
+
+    def test_change_counter(self):
+        recipe = self.recipes[0]
+        change_counter(Recipe, recipe.pk, 'favorites_count', 1)
+        change_counter(Recipe, recipe.pk, 'favorites_count', 2)
+        self.assertEqual(self.get_counts([recipe]), [3])
+        change_counter(Recipe, recipe.pk, 'favorites_count', -1)
+        self.assertEqual(self.get_counts([recipe]), [2])
+
+    def test_counter_not_below_zero(self):
+        recipe = self.recipes[0]
+        change_counter(Recipe, recipe.pk, 'favorites_count', 1)
+        change_counter(Recipe, recipe.pk, 'favorites_count', -5)
+        self.assertEqual(self.get_counts([recipe]), [0])
+
+    def test_change_counters_single_update(self):
+        first, second, other = self.recipes[:3]
+        change_counter(Recipe, first.pk, 'in_carts_count', 1)
+        with self.assertNumQueries(1):
+            change_counters(
+                Recipe, [first.pk, second.pk], 'in_carts_count', 1
+            )
+        self.assertEqual(
+            self.get_counts([first, second, other], 'in_carts_count'),
+            [2, 1, 0]
+        )
+        change_counters(Recipe, [first.pk, second.pk], 'in_carts_count', -2)
+        self.assertEqual(
+            self.get_counts([first, second, other], 'in_carts_count'),
+            [0, 0, 0]
+        )
+
+    def test_recipes_count_on_create_and_delete(self):
+        response = self.client.post('/api/recipes/', {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': image_data(),
+            'tags': [self.tags[0].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            User.objects.get(pk=self.user.pk).recipes_count, 1
+        )
+        response = self.client.delete(
+            f'/api/recipes/{response.data["id"]}/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            User.objects.get(pk=self.user.pk).recipes_count, 0
+        )
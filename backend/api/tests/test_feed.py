@@ -0,0 +1,100 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from api.tests.base import RecipesDataMixin, image_data
+from recipes.models import FeedEntry
+from users.models import User
+
+
+def feed_settings(fanout_limit):
+    return override_settings(FEED={
+        'FANOUT_LIMIT': fanout_limit, 'BACKFILL': 50, 'BATCH_SIZE': 1000
+    })
+
+
+class FeedTest(RecipesDataMixin, TestCase):
+    """
+    Лента подписок. Автор users[0] опубликовал recipes[0] и recipes[3],
+    подписываются users[1] и users[2].
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.clients = [self.client_for(user) for user in self.users]
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=user.pk))
+        return client
+
+    def subscribe(self, number, method='post'):
+        response = getattr(self.clients[number], method)(
+            f'/api/users/{self.user.id}/subscribe/'
+        )
+        self.assertIn(response.status_code, (201, 204))
+
+    def publish(self):
+        response = self.client_for(self.user).post('/api/recipes/', {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': image_data(),
+            'tags': [self.tags[0].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def get_feed(self, number):
+        response = self.clients[number].get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def get_entries(self, number):
+        return set(FeedEntry.objects.filter(
+            user=self.users[number]
+        ).values_list('recipe_id', flat=True))
+
+    def test_subscribe_backfills_feed(self):
+        self.assertEqual(self.get_feed(1), [])
+        self.subscribe(1)
+        self.assertEqual(
+            self.get_feed(1), [self.recipes[3].id, self.recipes[0].id]
+        )
+
+    def test_fan_out_on_write(self):
+        self.subscribe(1)
+        self.subscribe(2)
+        recipe_id = self.publish()
+        for number in (1, 2):
+            self.assertIn(recipe_id, self.get_entries(number))
+            self.assertEqual(self.get_feed(number)[0], recipe_id)
+        self.assertEqual(self.get_entries(0), set())
+
+    def test_unsubscribe_clears_feed(self):
+        self.subscribe(1)
+        self.subscribe(1, method='delete')
+        self.assertEqual(self.get_entries(1), set())
+        self.assertEqual(self.get_feed(1), [])
+
+    @feed_settings(fanout_limit=1)
+    def test_large_author_merged_on_read(self):
+        self.subscribe(1)
+        self.subscribe(2)
+        recipe_id = self.publish()
+        self.assertNotIn(recipe_id, self.get_entries(1))
+        entries = FeedEntry.objects.count()
+        self.assertEqual(self.get_feed(1), [
+            recipe_id, self.recipes[3].id, self.recipes[0].id
+        ])
+        # Чтение ленты ничего не записывает
+        self.assertEqual(FeedEntry.objects.count(), entries)
+
+    @feed_settings(fanout_limit=1)
+    def test_author_below_limit_backfilled(self):
+        self.subscribe(1)
+        self.subscribe(2)
+        recipe_id = self.publish()
+        self.subscribe(2, method='delete')
+        self.assertIn(recipe_id, self.get_entries(1))
+        self.assertEqual(self.get_feed(1)[0], recipe_id)
+        self.assertEqual(self.get_entries(2), set())
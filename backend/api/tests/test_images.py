@@ -0,0 +1,135 @@
+import base64
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.exceptions import ValidationError
+from api.serializers import Base64ImageField
+from api.tests.base import RecipesDataMixin, image_bytes, image_data
+from recipes.images import process_recipe_image
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+    """Декодирование base64 частями, переносы строк и ограничения."""
+
+    def setUp(self):
+        self.field = Base64ImageField()
+        self.content = image_bytes()
+
+    def decode(self, encoded, ext='png'):
+        file = self.field.decode(f'data:image/{ext};base64,' + encoded)
+        try:
+            return file.read(), file.size
+        finally:
+            file.close()
+
+    def assert_invalid(self, encoded, ext='png'):
+        with self.assertRaises(ValidationError):
+            self.decode(encoded, ext)
+
+    def test_decode(self):
+        encoded = base64.b64encode(self.content).decode()
+        self.assertEqual(
+            self.decode(encoded), (self.content, len(self.content))
+        )
+
+    def test_line_wrapped(self):
+        """MIME-base64: строки по 76 символов с переводами \\n и \\r\\n."""
+        encoded = base64.encodebytes(self.content).decode()
+        self.assertIn('\n', encoded)
+        self.assertEqual(self.decode(encoded)[0], self.content)
+        self.assertEqual(
+            self.decode(encoded.replace('\n', '\r\n'))[0], self.content
+        )
+
+    def test_line_wrapped_across_chunks(self):
+        """Остаток части, не кратный четырем, переносится в следующую."""
+        self.field.chunk_size = 10
+        encoded = base64.encodebytes(self.content).decode()
+        self.assertEqual(self.decode(encoded)[0], self.content)
+
+    def test_invalid_base64(self):
+        encoded = base64.b64encode(self.content).decode()
+        for invalid in (
+            encoded[:-1],
+            encoded[:100] + '!' + encoded[101:],
+            'iVBO==' + encoded,
+            encoded + 'AAAA',
+        ):
+            with self.subTest(invalid=invalid[:20]):
+                self.assert_invalid(invalid)
+
+    def test_signature(self):
+        encoded = base64.b64encode(self.content).decode()
+        self.assert_invalid(encoded, 'jpeg')
+        self.assert_invalid(base64.b64encode(b'GIF').decode(), 'gif')
+        self.assert_invalid(encoded, 'bmp')
+        self.assert_invalid('')
+
+    def test_oversized(self):
+        encoded = base64.encodebytes(image_bytes((2000, 2000))).decode()
+        self.field.chunk_size = 1024
+        with override_settings(MAX_IMAGE_UPLOAD_SIZE=2048):
+            with mock.patch(
+                'api.serializers.base64.b64decode',
+                wraps=base64.b64decode
+            ) as b64decode:
+                self.assert_invalid(encoded)
+        # Строка отклоняется сразу после превышения, не дочитываясь
+        self.assertLessEqual(b64decode.call_count, 3)
+        with override_settings(MAX_IMAGE_UPLOAD_SIZE=len(self.content)):
+            self.decode(base64.b64encode(self.content).decode())
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    IMAGE_PIPELINE=dict(settings.IMAGE_PIPELINE, WORKERS=0)
+)
+class RecipeImagesTest(RecipesDataMixin, TestCase):
+    """Варианты изображения видны в ответах после обработки."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def test_images_after_processing(self):
+        # Обработка откладывается, как в пуле потоков: до ее завершения
+        # ответы с пустым images успевают попасть в кеши
+        with mock.patch(
+            'recipes.images.process_recipe_image'
+        ) as process, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/recipes/', {
+                'name': 'Рецепт с картинкой',
+                'text': 'Описание',
+                'cooking_time': 5,
+                'image': image_data(),
+                'tags': [self.tags[0].id],
+                'ingredients': [
+                    {'id': self.ingredients[0].id, 'amount': 10}
+                ],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        url = '/api/recipes/{0}/'.format(response.data['id'])
+        for client in (self.anonymous, self.client):
+            self.assertEqual(client.get(url).json()['images'], {})
+            self.assertEqual(
+                client.get('/api/recipes/').json()['results'][0]['images'], {}
+            )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            process_recipe_image(*process.call_args.args)
+
+        for client in (self.anonymous, self.client):
+            with self.subTest(client=client):
+                images = client.get(url).json()['images']
+                self.assertIn('thumbnail_webp', images)
+                self.assertIn('medium_webp', images)
+                self.assertEqual(
+                    client.get('/api/recipes/').json()['results'][0]['images'],
+                    images
+                )
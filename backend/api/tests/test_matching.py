@@ -0,0 +1,171 @@
+from unittest import mock
+
+from django.test import TestCase
+from api.cache import reference_cache
+from api.matching import CHANGES_KEY, NAMESPACE, IngredientIndex
+from api.tests.base import RecipesDataMixin
+from recipes.models import IngredientRecipe
+
+
+class IngredientIndexTest(RecipesDataMixin, TestCase):
+    """
+    Подбор рецептов по ингредиентам и обновление индекса по журналу.
+    Рецепт i содержит ингредиенты 0..i % 5.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.index = IngredientIndex()
+        self.index.match([], 1)
+
+    def match(self, numbers, limit=10):
+        return self.index.match(
+            [self.ingredients[number].id for number in numbers], limit
+        )
+
+    def recipe_ids(self, numbers, limit=10):
+        return [recipe_id for recipe_id, _, _ in self.match(numbers, limit)]
+
+    def test_ratio_and_missing_ingredients(self):
+        recipes, ingredients = self.recipes, self.ingredients
+        self.assertEqual(self.match([0, 1], limit=4), [
+            (recipes[1].id, 1.0, []),
+            (recipes[5].id, 1.0, []),
+            (recipes[0].id, 1.0, []),
+            (recipes[2].id, 2 / 3, [ingredients[2].id]),
+        ])
+        recipe_id, ratio, missing = self.match([4])[0]
+        self.assertEqual(recipe_id, recipes[4].id)
+        self.assertEqual(ratio, 0.2)
+        self.assertEqual(
+            missing, [ingredient.id for ingredient in ingredients[:4]]
+        )
+
+    def test_ordering_by_ratio_then_matched_count(self):
+        recipes = self.recipes
+        self.assertEqual(self.recipe_ids([0]), [
+            recipes[5].id, recipes[0].id, recipes[1].id,
+            recipes[2].id, recipes[3].id, recipes[4].id,
+        ])
+        self.assertEqual(
+            self.recipe_ids([0, 1, 2, 3, 4], limit=2),
+            [recipes[4].id, recipes[3].id]
+        )
+        self.assertEqual(self.match([], limit=10), [])
+
+    def catch_up(self):
+        """Следующее обращение применяет журнал без перестройки."""
+        with mock.patch.object(
+            self.index, 'rebuild_in_background'
+        ) as rebuild:
+            self.index.ensure_fresh()
+        rebuild.assert_not_called()
+        self.assertEqual(self.index.sequence, self.index.get_sequence())
+
+    def test_created_row_applied_from_change_log(self):
+        recipe, ingredient = self.recipes[5], self.ingredients[4]
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1
+            )
+        self.catch_up()
+        self.assertEqual(self.match([4])[0], (
+            recipe.id, 0.5, [self.ingredients[0].id]
+        ))
+
+    def test_recipe_update_applied_from_change_log(self):
+        recipe, ingredients = self.recipes[3], self.ingredients
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{recipe.id}/',
+                {'ingredients': [
+                    {'id': ingredients[3].id, 'amount': 10},
+                    {'id': ingredients[4].id, 'amount': 10},
+                ]},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.catch_up()
+        self.assertNotIn(recipe.id, self.recipe_ids([0]))
+        self.assertEqual(self.match([3, 4])[0], (recipe.id, 1.0, []))
+
+    def test_deleted_recipe_removed_from_change_log(self):
+        recipe = self.recipes[5]
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        self.catch_up()
+        self.assertNotIn(recipe.id, self.recipe_ids([0]))
+
+    def test_uncommitted_changes_not_logged(self):
+        sequence = self.index.get_sequence()
+        with self.captureOnCommitCallbacks(execute=False):
+            IngredientRecipe.objects.filter(recipe=self.recipes[0]).delete()
+        self.assertEqual(self.index.get_sequence(), sequence)
+
+    def test_gap_in_change_log_triggers_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientRecipe.objects.filter(recipe=self.recipes[0]).delete()
+        reference_cache.backend.delete(
+            CHANGES_KEY.format(sequence=self.index.get_sequence())
+        )
+        with mock.patch.object(
+            self.index, 'rebuild_in_background'
+        ) as rebuild:
+            self.index.ensure_fresh()
+        rebuild.assert_called_once_with()
+        self.index.rebuild()
+        self.assertNotIn(self.recipes[0].id, self.recipe_ids([0]))
+
+    def test_invalidate_triggers_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            reference_cache.invalidate(NAMESPACE)
+        with mock.patch.object(
+            self.index, 'rebuild_in_background'
+        ) as rebuild:
+            self.index.ensure_fresh()
+        rebuild.assert_called_once_with()
+
+
+class WhatToCookTest(RecipesDataMixin, TestCase):
+    """Эндпоинт /api/recipes/what_to_cook/."""
+
+    url = '/api/recipes/what_to_cook/'
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('api.views.ingredient_index', IngredientIndex())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_results(self):
+        ingredients = self.ingredients
+        response = self.anonymous.get(self.url, {
+            'ingredients': f'{ingredients[0].id},{ingredients[1].id}',
+            'limit': 4,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['recipe']['id'] for item in response.data],
+            [self.recipes[number].id for number in (1, 5, 0, 2)]
+        )
+        last = response.data[-1]
+        self.assertAlmostEqual(last['match_ratio'], 2 / 3)
+        self.assertEqual(
+            [item['id'] for item in last['missing_ingredients']],
+            [ingredients[2].id]
+        )
+        self.assertEqual(last['missing_ingredients'][0]['name'],
+                         ingredients[2].name)
+
+    def test_invalid_params(self):
+        ingredient_id = self.ingredients[0].id
+        for params in (
+            {},
+            {'ingredients': ''},
+            {'ingredients': ingredient_id, 'limit': 0},
+            {'ingredients': ingredient_id, 'limit': 101},
+            {'ingredients': ingredient_id, 'limit': 'x'},
+        ):
+            with self.subTest(params=params):
+                response = self.anonymous.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
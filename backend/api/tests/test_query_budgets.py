@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.test import TestCase, override_settings
+from api.tests.base import RecipesDataMixin
+from recipes.models import Favorite
+from users.models import Subscribers
+
+
+@override_settings(
+    PROFILING=dict(settings.PROFILING, ENABLED=True, RAISE_ON_BUDGET=True)
+)
+class QueryBudgetTest(RecipesDataMixin, TestCase):
+    """
+    Каждый эндпоинт с бюджетом в PROFILING['QUERY_BUDGETS'] проходит
+    холодный (пустые кеши) и теплый путь: при превышении бюджета
+    ProfilingMiddleware выбрасывает QueryBudgetError.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Subscribers.objects.create(user=cls.user, author=cls.users[1])
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[1])
+
+    def assert_cold_and_warm(self, client, url):
+        self.clear_caches()
+        for path in ('cold', 'warm'):
+            with self.subTest(url=url, path=path):
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_read_endpoints(self):
+        recipe = self.recipes[0]
+        urls = (
+            '/api/recipes/',
+            '/api/recipes/?tags=tag0&tags=tag1',
+            '/api/recipes/?search=Рецепт&tags=tag0&is_favorited=1'
+            '&is_in_shopping_cart=0&author={0}'.format(self.users[1].id),
+            f'/api/recipes/{recipe.id}/',
+            '/api/recipes/trending/',
+            '/api/tags/',
+            '/api/ingredients/',
+            '/api/ingredients/?name=ингр',
+        )
+        for url in urls:
+            self.assert_cold_and_warm(self.anonymous, url)
+            self.assert_cold_and_warm(self.client, url)
+
+    def test_authenticated_endpoints(self):
+        for url in (
+            '/api/recipes/feed/',
+            '/api/users/subscriptions/',
+            '/api/users/subscriptions/?recipes_limit=2',
+        ):
+            self.assert_cold_and_warm(self.client, url)
+
+    def test_bulk_endpoints(self):
+        ids = {'recipes': [recipe.id for recipe in self.recipes]}
+        for url in (
+            '/api/recipes/favorite/bulk/',
+            '/api/recipes/shopping_cart/bulk/',
+        ):
+            for method in ('post', 'post', 'delete', 'delete'):
+                self.clear_caches()
+                with self.subTest(url=url, method=method):
+                    response = getattr(self.client, method)(
+                        url, ids, format='json'
+                    )
+                    self.assertEqual(response.status_code, 200)
@@ -0,0 +1,123 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from api.matching import ingredient_index
+from api.serializers import RecipeSerializer
+from api.tests.base import RecipesDataMixin, image_data
+from recipes.models import IngredientRecipe
+
+
+class RecipeUpdateTest(RecipesDataMixin, TestCase):
+    """Обновление ингредиентов рецепта по разнице."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[3]
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def get_rows(self):
+        return {
+            row.ingredient_id: (row.pk, row.amount)
+            for row in IngredientRecipe.objects.filter(recipe=self.recipe)
+        }
+
+    def update(self, amounts):
+        """PATCH ингредиентов; возвращает SQL, менявший IngredientRecipe."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(self.url, {'ingredients': [
+                {'id': self.ingredients[index].id, 'amount': amount}
+                for index, amount in amounts.items()
+            ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [
+            query['sql'].split()[0] for query in context.captured_queries
+            if 'recipes_ingredientrecipe' in query['sql']
+            and not query['sql'].startswith('SELECT')
+        ]
+
+    def test_update_keeps_unchanged_rows(self):
+        ingredients = self.ingredients
+        before = self.get_rows()
+        self.assertEqual(len(before), 4)
+        with mock.patch.object(ingredient_index, 'apply') as apply:
+            statements = self.update({0: 100, 1: 50, 4: 5})
+        self.assertEqual(statements, ['DELETE', 'UPDATE', 'INSERT'])
+        # Удаление без сигналов: индекс обновляется одним вызовом
+        apply.assert_called_once_with(
+            added=[(self.recipe.id, ingredients[4].id)],
+            removed=[
+                (self.recipe.id, ingredients[2].id),
+                (self.recipe.id, ingredients[3].id),
+            ]
+        )
+        after = self.get_rows()
+        self.assertEqual(set(after), {
+            ingredients[0].id, ingredients[1].id, ingredients[4].id
+        })
+        self.assertEqual(after[ingredients[0].id], before[ingredients[0].id])
+        self.assertEqual(
+            after[ingredients[1].id], (before[ingredients[1].id][0], 50)
+        )
+        self.assertEqual(after[ingredients[4].id][1], 5)
+
+    def test_unchanged_ingredients(self):
+        before = self.get_rows()
+        self.assertEqual(self.update({0: 100, 1: 100, 2: 100, 3: 100}), [])
+        self.assertEqual(self.get_rows(), before)
+
+
+class RecipeValidationTest(RecipesDataMixin, TestCase):
+    """Проверка id ингредиентов и тегов одним запросом на поле."""
+
+    def get_payload(self, ingredient_ids, tag_ids):
+        return {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': image_data(),
+            'tags': tag_ids,
+            'ingredients': [
+                {'id': pk, 'amount': 10} for pk in ingredient_ids
+            ],
+        }
+
+    def validate(self, payload):
+        serializer = RecipeSerializer(data=payload)
+        serializer.is_valid()
+        return serializer
+
+    def test_one_query_per_field(self):
+        payload = self.get_payload(
+            [ingredient.id for ingredient in self.ingredients],
+            [tag.id for tag in self.tags]
+        )
+        with self.assertNumQueries(2):
+            serializer = self.validate(payload)
+        self.assertEqual(serializer.errors, {})
+        self.assertEqual(
+            serializer.validated_data['tags'], self.tags
+        )
+        self.assertEqual(
+            [item['ingredient'] for item in
+             serializer.validated_data['ingredients']],
+            self.ingredients
+        )
+
+    def test_all_unknown_ids_in_one_error(self):
+        payload = self.get_payload(
+            [self.ingredients[0].id, 10 ** 6, 10 ** 6 + 1],
+            [self.tags[0].id, 10 ** 6 + 2, 10 ** 6 + 3]
+        )
+        with self.assertNumQueries(2):
+            serializer = self.validate(payload)
+        self.assertEqual(serializer.errors['tags'], [
+            'Объекты с id 1000002, 1000003 не найдены.'
+        ])
+        self.assertEqual(serializer.errors['ingredients'], [
+            'Объекты с id 1000000, 1000001 не найдены.'
+        ])
+        response = self.client.post('/api/recipes/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'tags', 'ingredients'})
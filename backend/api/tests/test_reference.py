@@ -0,0 +1,114 @@
+from django.db import transaction
+from django.test import TestCase
+from api.cache import reference_cache
+from api.tests.base import RecipesDataMixin
+from recipes.models import Ingredient
+
+
+class IngredientFilterTest(RecipesDataMixin, TestCase):
+    """Подсказки ингредиентов: поиск по названию и ?limit=."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Ingredient.objects.create(name='сыр ингредиент', measurement_unit='г')
+
+    def get_names(self, params):
+        response = self.anonymous.get('/api/ingredients/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()]
+
+    def test_startswith_first(self):
+        names = self.get_names({'name': 'ингред'})
+        self.assertEqual(names[-1], 'сыр ингредиент')
+        self.assertEqual(len(names), 6)
+
+    def test_limit_after_filters(self):
+        self.assertEqual(
+            self.get_names({'name': 'ингред', 'limit': 2}),
+            ['ингредиент 0', 'ингредиент 1']
+        )
+        self.assertEqual(len(self.get_names({'limit': 3})), 3)
+
+    def test_invalid_limit(self):
+        for limit in ('0', '-1', 'abc'):
+            with self.subTest(limit=limit):
+                response = self.anonymous.get(
+                    '/api/ingredients/', {'limit': limit}
+                )
+                self.assertEqual(response.status_code, 400)
+
+    def test_limit_ignored_on_detail(self):
+        ingredient = self.ingredients[0]
+        response = self.anonymous.get(
+            f'/api/ingredients/{ingredient.id}/', {'limit': 1}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], ingredient.id)
+
+
+class ReferenceCacheTest(RecipesDataMixin, TestCase):
+    """ETag/Last-Modified, ответ 304 и сброс кеша после изменений."""
+
+    def get(self, url, **headers):
+        return self.anonymous.get(url, **headers)
+
+    def test_not_modified(self):
+        for url in ('/api/tags/', '/api/ingredients/'):
+            with self.subTest(url=url):
+                response = self.get(url)
+                self.assertEqual(response.status_code, 200)
+                etag = response['ETag']
+                last_modified = response['Last-Modified']
+                response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                response = self.get(
+                    url, HTTP_IF_MODIFIED_SINCE=last_modified
+                )
+                self.assertEqual(response.status_code, 304)
+                response = self.get(url, HTTP_IF_NONE_MATCH='"other"')
+                self.assertEqual(response.status_code, 200)
+
+    def test_tag_edit(self):
+        url = '/api/tags/'
+        etag = self.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tags[0].name = 'Новый'
+            self.tags[0].save()
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['name'], 'Новый')
+
+    def test_ingredient_edit_and_delete(self):
+        url = f'/api/ingredients/{self.ingredients[0].id}/'
+        self.assertEqual(self.get(url).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingredients[0].name = 'соль'
+            self.ingredients[0].save()
+        self.assertEqual(self.get(url).json()['name'], 'соль')
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='перец', measurement_unit='г')
+        self.assertIn(
+            'перец',
+            [item['name'] for item in self.get('/api/ingredients/').json()]
+        )
+
+    def test_version_bumped_after_commit(self):
+        version = reference_cache.get_version('tags')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.tags[0].save()
+            self.assertEqual(reference_cache.get_version('tags'), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(reference_cache.get_version('tags'), version)
+
+    def test_rolled_back_write(self):
+        etag = self.get('/api/tags/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.tags[0].save()
+                transaction.set_rollback(True)
+        response = self.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
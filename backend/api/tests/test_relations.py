@@ -0,0 +1,170 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from api import utils
+from api.tests.base import RecipesDataMixin
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscribers, User
+
+OLD_SQLITE = (3, 34, 1)
+
+
+class RecipeRelationTest(RecipesDataMixin, TestCase):
+    """Добавление и удаление рецепта в избранное и список покупок."""
+
+    relations = (
+        ('favorite', Favorite, 'favorites_count', 'favorites'),
+        ('shopping_cart', ShoppingCart, 'in_carts_count', 'cart'),
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[1]
+
+    def get_count(self, counter):
+        return getattr(Recipe.objects.get(pk=self.recipe.pk), counter)
+
+    def toggle(self, action, method, pk=None):
+        return getattr(self.client, method)(
+            f'/api/recipes/{pk or self.recipe.id}/{action}/'
+        )
+
+    def test_add_and_remove(self):
+        for action, model, counter, _ in self.relations:
+            with self.subTest(action=action):
+                response = self.toggle(action, 'post')
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.data['id'], self.recipe.id)
+                self.assertTrue(model.objects.filter(
+                    user=self.user, recipe=self.recipe
+                ).exists())
+                self.assertEqual(self.get_count(counter), 1)
+                self.assertEqual(
+                    self.toggle(action, 'delete').status_code, 204
+                )
+                self.assertFalse(model.objects.exists())
+                self.assertEqual(self.get_count(counter), 0)
+
+    def test_repeated_requests(self):
+        for action, _, counter, _ in self.relations:
+            with self.subTest(action=action):
+                self.toggle(action, 'post')
+                response = self.toggle(action, 'post')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(self.get_count(counter), 1)
+                self.toggle(action, 'delete')
+                response = self.toggle(action, 'delete')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(self.get_count(counter), 0)
+
+    def test_unknown_recipe(self):
+        for action, model, _, _ in self.relations:
+            for method in ('post', 'delete'):
+                with self.subTest(action=action, method=method):
+                    response = self.toggle(action, method, pk=10**6)
+                    self.assertEqual(response.status_code, 404)
+            self.assertFalse(model.objects.exists())
+
+    def test_caches_invalidated(self):
+        for action, _, _, state in self.relations:
+            with self.subTest(action=action):
+                with mock.patch(
+                    'api.signals.user_state.invalidate'
+                ) as invalidate_state, mock.patch(
+                    'api.signals.response_cache.invalidate'
+                ) as invalidate_responses:
+                    self.toggle(action, 'post')
+                    self.toggle(action, 'post')
+                invalidate_state.assert_called_once_with(self.user.id, state)
+                invalidate_responses.assert_called_once_with(
+                    f'recipe:{self.recipe.id}'
+                )
+
+    def test_conflict_target(self):
+        with CaptureQueriesContext(connection) as context:
+            self.toggle('favorite', 'post')
+        self.assertTrue(any(
+            'ON CONFLICT ("user_id", "recipe_id") DO NOTHING' in query['sql']
+            for query in context.captured_queries
+        ))
+
+    def test_returning_required(self):
+        database = connection.Database
+        with mock.patch.object(
+            utils, 'change_relation_orm', wraps=utils.change_relation_orm
+        ) as orm:
+            self.toggle('favorite', 'post')
+            orm.assert_not_called()
+            with mock.patch.object(
+                database, 'sqlite_version_info', OLD_SQLITE
+            ):
+                self.assertEqual(self.toggle('favorite', 'post').status_code,
+                                 400)
+                self.assertEqual(
+                    self.toggle('favorite', 'delete').status_code, 204
+                )
+                self.assertEqual(
+                    self.toggle('favorite', 'post').status_code, 201
+                )
+        self.assertEqual(orm.call_count, 3)
+        self.assertEqual(self.get_count('favorites_count'), 1)
+
+    def test_bulk_returning_required(self):
+        ids = [recipe.id for recipe in self.recipes[:3]]
+        with mock.patch.object(
+            connection.Database, 'sqlite_version_info', OLD_SQLITE
+        ), mock.patch.object(
+            utils, 'change_relations_orm', wraps=utils.change_relations_orm
+        ) as orm:
+            response = self.client.post(
+                '/api/recipes/favorite/bulk/', {'recipes': ids},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        orm.assert_called_once()
+        self.assertEqual(Favorite.objects.filter(user=self.user).count(), 3)
+
+
+class SubscribeTest(RecipesDataMixin, TestCase):
+    """Подписка на автора и отписка."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = self.users[1]
+        self.url = f'/api/users/{self.author.id}/subscribe/'
+
+    def get_followers(self):
+        return User.objects.get(pk=self.author.pk).followers_count
+
+    def test_subscribe_and_unsubscribe(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['id'], self.author.id)
+        self.assertTrue(response.data['is_subscribed'])
+        self.assertEqual(self.get_followers(), 1)
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+        self.assertEqual(self.get_followers(), 1)
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertEqual(self.get_followers(), 0)
+        self.assertEqual(self.client.delete(self.url).status_code, 400)
+        self.assertEqual(self.get_followers(), 0)
+
+    def test_self_subscribe(self):
+        response = self.client.post(f'/api/users/{self.user.id}/subscribe/')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Subscribers.objects.exists())
+
+    def test_unknown_author(self):
+        for method in ('post', 'delete'):
+            with self.subTest(method=method):
+                response = getattr(self.client, method)(
+                    f'/api/users/{10**6}/subscribe/'
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_subscriptions_state_invalidated(self):
+        with mock.patch('api.signals.user_state.invalidate') as invalidate:
+            self.client.post(self.url)
+        invalidate.assert_called_once_with(self.user.id, 'subscriptions')
@@ -0,0 +1,102 @@
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from api.tests.base import RecipesDataMixin
+from foodgram.db.routers import replicas
+
+REPLICA = 'replica'
+PROXY = '172.18.0.5'
+
+
+# Алиас реплики (зеркало тестовой основной БД) задается в
+# foodgram.test_settings: соединения и тестовые БД создаются до
+# override_settings, поэтому DATABASES в тесте не переопределить
+@skipUnless(
+    REPLICA in settings.DATABASES,
+    'Запуск с --settings=foodgram.test_settings'
+)
+@override_settings(DATABASE_REPLICAS={REPLICA: 1})
+class ReplicaRoutingTest(RecipesDataMixin, TransactionTestCase):
+    """Выбор реплики, чтение после записи и недоступная реплика."""
+    databases = {'default', REPLICA}
+
+    def setUp(self):
+        self.setUpTestData()
+        super().setUp()
+        replicas._down.clear()
+        self.recipe = self.recipes[0]
+        self.client = self.get_client('203.0.113.1')
+        self.other = self.get_client('203.0.113.2')
+
+    def get_client(self, address):
+        """Клиент за nginx: REMOTE_ADDR - прокси, IP - в X-Forwarded-For."""
+        client = APIClient(
+            REMOTE_ADDR=PROXY, HTTP_X_FORWARDED_FOR=f'10.1.1.1, {address}'
+        )
+        client.force_authenticate(self.user)
+        return client
+
+    def get_aliases(self, client, url, replica_down=False):
+        """Алиасы БД, к которым обращался запрос."""
+        error = DatabaseError if replica_down else None
+        with CaptureQueriesContext(connections['default']) as default:
+            with CaptureQueriesContext(connections[REPLICA]) as replica:
+                with mock.patch.object(
+                    connections[REPLICA], 'ensure_connection',
+                    side_effect=error,
+                    wraps=connections[REPLICA].ensure_connection
+                ):
+                    response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return {
+            alias for alias, context in (
+                ('default', default), (REPLICA, replica)
+            ) if len(context)
+        }
+
+    def test_reads_from_replica(self):
+        self.assertEqual(
+            self.get_aliases(self.client, f'/api/recipes/{self.recipe.id}/'),
+            {REPLICA}
+        )
+        self.assertEqual(
+            self.get_aliases(self.anonymous, '/api/tags/'), {REPLICA}
+        )
+
+    def test_sticky_after_write(self):
+        response = self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.assertEqual(self.get_aliases(self.client, url), {'default'})
+        # Другой клиент за тем же прокси читает с реплики
+        self.clear_caches()
+        self.assertEqual(self.get_aliases(self.other, url), {REPLICA})
+
+    def test_forwarded_for_from_untrusted_address(self):
+        """X-Forwarded-For не от доверенного прокси не учитывается."""
+        spoofing = APIClient(
+            REMOTE_ADDR='198.51.100.7', HTTP_X_FORWARDED_FOR='203.0.113.1'
+        )
+        spoofing.force_authenticate(self.user)
+        spoofing.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertEqual(
+            self.get_aliases(self.client, f'/api/recipes/{self.recipe.id}/'),
+            {REPLICA}
+        )
+
+    def test_replica_down(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.assertEqual(
+            self.get_aliases(self.client, url, replica_down=True),
+            {'default'}
+        )
+        # Реплика исключена на RETRY_INTERVAL секунд
+        self.clear_caches()
+        self.assertEqual(self.get_aliases(self.client, url), {'default'})
+        replicas._down.clear()
+        self.clear_caches()
+        self.assertEqual(self.get_aliases(self.client, url), {REPLICA})
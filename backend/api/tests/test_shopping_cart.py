@@ -0,0 +1,76 @@
+import csv
+import io
+
+from django.test import TestCase
+from api.tests.base import RecipesDataMixin
+from api.utils import get_shopping_cart_ingredients
+from recipes.models import Ingredient, IngredientRecipe, ShoppingCart
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+class ShoppingCartExportTest(RecipesDataMixin, TestCase):
+    """Сумма ингредиентов списка покупок и выгрузка в txt/csv/pdf."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        kilograms = Ingredient.objects.create(
+            name='ингредиент 0', measurement_unit='кг'
+        )
+        IngredientRecipe.objects.create(
+            recipe=cls.recipes[1], ingredient=kilograms, amount=2
+        )
+        for recipe in cls.recipes[:2]:
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def download(self, export_format):
+        response = self.client.get(URL, {'format': export_format})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_aggregation(self):
+        with self.assertNumQueries(1):
+            ingredients = list(get_shopping_cart_ingredients(self.user))
+        self.assertEqual(
+            [
+                (item['name'], item['measurement_unit'], item['total_amount'])
+                for item in ingredients
+            ],
+            [
+                ('ингредиент 0', 'г', 200),
+                ('ингредиент 0', 'кг', 2),
+                ('ингредиент 1', 'г', 100),
+            ]
+        )
+
+    def test_txt(self):
+        self.assertEqual(self.download('txt').decode(), (
+            'ингредиент 0 - 200 (г)\n'
+            'ингредиент 0 - 2 (кг)\n'
+            'ингредиент 1 - 100 (г)\n'
+        ))
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.download('csv').decode())))
+        self.assertEqual(rows, [
+            ['name', 'measurement_unit', 'amount'],
+            ['ингредиент 0', 'г', '200'],
+            ['ингредиент 0', 'кг', '2'],
+            ['ингредиент 1', 'г', '100'],
+        ])
+
+    def test_pdf_embeds_cyrillic_font(self):
+        content = self.download('pdf')
+        self.assertTrue(content.startswith(b'%PDF'))
+        self.assertIn(b'DejaVuSans', content)
+
+    def test_empty_cart(self):
+        ShoppingCart.objects.filter(user=self.user).delete()
+        for export_format in ('txt', 'csv', 'pdf'):
+            with self.subTest(export_format=export_format):
+                response = self.client.get(URL, {'format': export_format})
+                self.assertEqual(response.status_code, 400)
+
+    def test_anonymous(self):
+        self.assertEqual(self.anonymous.get(URL).status_code, 401)
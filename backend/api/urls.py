@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
+from api.async_views import async_patterns
 from api.views import (
     IngredientViewSet,
+    MetricsView,
     RecipeViewSet,
+    ReferenceCacheStatsView,
     TagViewSet,
     UsersViewSet
 )
@@ -13,8 +17,14 @@ router.register(r'ingredients', IngredientViewSet)
 router.register(r'recipes', RecipeViewSet)
 router.register(r'tags', TagViewSet)
 
+router_urls = router.urls
+if settings.ASYNC_VIEWS['ENABLED']:
+    router_urls = async_patterns(router_urls)
+
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('_metrics/', MetricsView.as_view()),
+    path('_metrics/reference-cache/', ReferenceCacheStatsView.as_view()),
+    path('', include(router_urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
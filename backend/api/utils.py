@@ -1,30 +1,326 @@
-from django.http import HttpResponse
-from recipes.models import ShoppingCart
-
-
-def get_shopping_cart(request):
-    shopping_cart = ShoppingCart.objects.filter(user=request.user).all()
-    shopping_list = {}
-    for item in shopping_cart:
-        for recipe_ingredient in item.recipe.recipe_ingredient.all():
-            name = recipe_ingredient.ingredient.name
-            measuring_unit = recipe_ingredient.ingredient.measurement_unit
-            amount = recipe_ingredient.amount
-            if name not in shopping_list:
-                shopping_list[name] = {
-                    'name': name,
-                    'measurement_unit': measuring_unit,
-                    'amount': amount,
-                }
-            else:
-                shopping_list[name]['amount'] += amount
-    content = ([
-        f'{item["name"]}- {item["amount"]} '
-        f'({item["measurement_unit"]})\n'
-        for item in shopping_list.values()]
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+from django.dispatch import Signal
+from django.http import StreamingHttpResponse
+from recipes.models import IngredientRecipe
+from rest_framework.exceptions import ValidationError
+
+# Отправляется после изменения связей пользователя (избранное, список
+# покупок, подписки) функциями change_relation(s): сырой SQL не вызывает
+# post_save/post_delete, а кеши нужно сбросить (см. api.signals)
+relations_changed = Signal()
+
+
+def supports_returning():
+    """INSERT/DELETE ... RETURNING: PostgreSQL и SQLite с версии 3.35."""
+    if connection.vendor == 'postgresql':
+        return True
+    return (
+        connection.vendor == 'sqlite'
+        and connection.Database.sqlite_version_info >= (3, 35)
+    )
+
+
+def change_counter(model, pk, field, delta):
+    """
+    Атомарно изменяет денормализованный счетчик на delta одним UPDATE
+    с F-выражением; значение не опускается ниже нуля.
+    """
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def change_counters(model, pks, field, delta):
+    """change_counter для нескольких объектов одним UPDATE."""
+    model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def change_relation(model, user_id, target_field, target_id, counter, add):
+    """
+    Добавляет (add=True) или удаляет связь пользователя с рецептом
+    или автором и меняет счетчик counter у цели на ±1.
+    Повторное добавление не нарушает уникальное ограничение модели
+    (ON CONFLICT (user, цель) DO NOTHING), повторное удаление ничего
+    не делает. Возвращает объект цели с новым значением счетчика или
+    None, если строк не изменилось (связь уже была/ее не было или цели
+    нет). На PostgreSQL это один запрос: INSERT/DELETE ... RETURNING
+    в CTE и UPDATE счетчика ... RETURNING. После изменения
+    отправляется relations_changed.
+    """
+    if not supports_returning():
+        target = change_relation_orm(
+            model, user_id, target_field, target_id, counter, add
+        )
+    else:
+        target = change_relation_sql(
+            model, user_id, target_field, target_id, counter, add
+        )
+    if target is not None:
+        relations_changed.send(
+            sender=model, user_id=user_id, target_ids=[target_id]
+        )
+    return target
+
+
+def change_relation_sql(model, user_id, target_field, target_id, counter,
+                        add):
+    """change_relation через INSERT/DELETE ... RETURNING."""
+    field = model._meta.get_field(target_field)
+    target_model = field.related_model
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    target_table = quote(target_model._meta.db_table)
+    target_pk = quote(target_model._meta.pk.column)
+    column = quote(field.column)
+    user_column = quote(model._meta.get_field('user').column)
+    counter_column = quote(target_model._meta.get_field(counter).column)
+    if add:
+        defaults = [
+            model_field for model_field in model._meta.concrete_fields
+            if model_field.has_default() and not model_field.primary_key
+        ]
+        columns = ', '.join(
+            [user_column, column]
+            + [quote(model_field.column) for model_field in defaults]
+        )
+        values = ', '.join(['%s', target_pk] + ['%s'] * len(defaults))
+        change = (
+            f'INSERT INTO {table} ({columns}) '
+            f'SELECT {values} FROM {target_table} WHERE {target_pk} = %s '
+            f'ON CONFLICT ({user_column}, {column}) DO NOTHING '
+            f'RETURNING {column}'
+        )
+        params = [user_id] + [
+            model_field.get_db_prep_save(model_field.get_default(), connection)
+            for model_field in defaults
+        ] + [target_id]
+    else:
+        change = (
+            f'DELETE FROM {table} '
+            f'WHERE {user_column} = %s AND {column} = %s '
+            f'RETURNING {column}'
+        )
+        params = [user_id, target_id]
+    delta = 1 if add else -1
+    update = (
+        f'UPDATE {target_table} SET {counter_column} = CASE '
+        f'WHEN {counter_column} + %s > 0 THEN {counter_column} + %s '
+        f'ELSE 0 END WHERE {target_pk} '
+    )
+    if connection.vendor == 'postgresql':
+        targets = target_model.objects.raw(
+            f'WITH changed AS ({change}) {update}'
+            f'IN (SELECT {column} FROM changed) RETURNING {target_table}.*',
+            params + [delta, delta],
+            using=connection.alias
+        )
+        return next(iter(targets), None)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(change, params)
+            if cursor.fetchone() is None:
+                return None
+        return next(iter(target_model.objects.raw(
+            f'{update}= %s RETURNING *', [delta, delta, target_id],
+            using=connection.alias
+        )), None)
+
+
+def change_relation_orm(model, user_id, target_field, target_id, counter,
+                        add):
+    """
+    change_relation для СУБД без ON CONFLICT ... RETURNING
+    (в том числе SQLite до 3.35).
+    """
+    field = model._meta.get_field(target_field)
+    relation = {'user_id': user_id, field.attname: target_id}
+    with transaction.atomic():
+        if add:
+            if not field.related_model.objects.filter(pk=target_id).exists():
+                return None
+            try:
+                with transaction.atomic():
+                    model.objects.create(**relation)
+            except IntegrityError:
+                return None
+        elif not model.objects.filter(**relation).delete()[0]:
+            return None
+        change_counter(field.related_model, target_id, counter,
+                       1 if add else -1)
+        return field.related_model.objects.get(pk=target_id)
+
+
+def change_relations(model, user_id, target_field, target_ids, counter,
+                     add):
+    """
+    Массовый вариант change_relation: добавляет или удаляет связи
+    пользователя с целями target_ids и меняет их счетчики counter
+    на ±1 только для строк, которые действительно вставлены/удалены.
+    Возвращает множество id измененных целей.
+    Строки берутся из INSERT ... ON CONFLICT DO NOTHING / DELETE ...
+    RETURNING, если СУБД это поддерживает (supports_returning), иначе
+    из сравнения связей до и после записи.
+    """
+    if supports_returning():
+        changed = change_relations_sql(
+            model, user_id, target_field, target_ids, counter, add
+        )
+    else:
+        changed = change_relations_orm(
+            model, user_id, target_field, target_ids, counter, add
+        )
+    if changed:
+        relations_changed.send(
+            sender=model, user_id=user_id, target_ids=changed
+        )
+    return changed
+
+
+def change_relations_sql(model, user_id, target_field, target_ids, counter,
+                         add):
+    """change_relations через INSERT/DELETE ... RETURNING."""
+    field = model._meta.get_field(target_field)
+    target_model = field.related_model
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    target_table = quote(target_model._meta.db_table)
+    target_pk = quote(target_model._meta.pk.column)
+    column = quote(field.column)
+    user_column = quote(model._meta.get_field('user').column)
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    if add:
+        defaults = [
+            model_field for model_field in model._meta.concrete_fields
+            if model_field.has_default() and not model_field.primary_key
+        ]
+        columns = ', '.join(
+            [user_column, column]
+            + [quote(model_field.column) for model_field in defaults]
+        )
+        values = ', '.join(['%s', target_pk] + ['%s'] * len(defaults))
+        change = (
+            f'INSERT INTO {table} ({columns}) '
+            f'SELECT {values} FROM {target_table} '
+            f'WHERE {target_pk} IN ({placeholders}) '
+            f'ON CONFLICT ({user_column}, {column}) DO NOTHING '
+            f'RETURNING {column}'
+        )
+        params = [user_id] + [
+            model_field.get_db_prep_save(model_field.get_default(), connection)
+            for model_field in defaults
+        ] + list(target_ids)
+    else:
+        change = (
+            f'DELETE FROM {table} '
+            f'WHERE {user_column} = %s AND {column} IN ({placeholders}) '
+            f'RETURNING {column}'
+        )
+        params = [user_id] + list(target_ids)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(change, params)
+            changed = {row[0] for row in cursor.fetchall()}
+        if changed:
+            change_counters(target_model, changed, counter, 1 if add else -1)
+    return changed
+
+
+def change_relations_orm(model, user_id, target_field, target_ids, counter,
+                         add):
+    """change_relations для СУБД без ON CONFLICT ... RETURNING."""
+    field = model._meta.get_field(target_field)
+    relations = model.objects.filter(
+        user_id=user_id, **{f'{field.attname}__in': target_ids}
+    )
+    with transaction.atomic():
+        before = set(relations.values_list(field.attname, flat=True))
+        if add:
+            model.objects.bulk_create(
+                [
+                    model(user_id=user_id, **{field.attname: target_id})
+                    for target_id in target_ids
+                ],
+                ignore_conflicts=True
+            )
+        else:
+            relations.delete()
+        after = set(relations.values_list(field.attname, flat=True))
+        changed = after - before if add else before - after
+        if changed:
+            change_counters(
+                field.related_model, changed, counter, 1 if add else -1
+            )
+    return changed
+
+
+def get_limit_param(request, name):
+    """
+    Значение параметра ?<name>= или None, если он не передан.
+    Некорректное значение приводит к ответу 400.
+    """
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    if not value.isdigit() or int(value) < 1:
+        raise ValidationError(
+            {name: 'Должно быть целым положительным числом.'}
+        )
+    return int(value)
+
+
+def get_recipes_limit(request):
+    """Значение параметра ?recipes_limit= (см. get_limit_param)."""
+    return get_limit_param(request, 'recipes_limit')
+
+
+def get_ids_param(request, name):
+    """
+    Список id из параметра запроса: ?name=1,2,3 или ?name=1&name=2.
+    Некорректное значение приводит к ответу 400.
+    """
+    values = [
+        value
+        for param in request.query_params.getlist(name)
+        for value in param.split(',') if value
+    ]
+    if not all(value.isdigit() for value in values):
+        raise ValidationError({name: 'Ожидается список целых чисел.'})
+    return [int(value) for value in values]
+
+
+def get_shopping_cart_ingredients(user):
+    """
+    Суммарное количество каждого ингредиента из списка покупок.
+    Агрегация выполняется одним запросом, группировка идет по id
+    ингредиента, поэтому одноименные ингредиенты с разными единицами
+    измерения не складываются.
+    """
+    return IngredientRecipe.objects.filter(
+        recipe__shopping_cart__user=user
+    ).values(
+        'ingredient',
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit')
+    ).annotate(
+        total_amount=Sum('amount')
+    ).order_by('name', 'measurement_unit')
+
+
+def get_shopping_cart(request, ingredients):
+    """Потоковая выгрузка списка покупок в выбранном формате."""
+    renderer = request.accepted_renderer
+    filename = f'shopping_list.{renderer.format}'
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = f'{content_type}; charset={renderer.charset}'
+    response = StreamingHttpResponse(
+        renderer.stream(ingredients.iterator()),
+        content_type=content_type
     )
-    filename = 'shopping_list.txt'
-    response = HttpResponse(content, content_type='text/plain')
     response['Content-Disposition'] = (
         'attachment; filename={0}'.format(filename)
     )
@@ -1,37 +1,89 @@
 from djoser.views import UserViewSet
+from django.db.models import (
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Value,
+)
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.permissions import (
     AllowAny,
     IsAuthenticated,
+    IsAdminUser,
     IsAuthenticatedOrReadOnly,
 )
-from api.utils import get_shopping_cart
-from api.paginations import CustomPaginator
+from api.cache import (
+    AnonymousResponseCacheMixin,
+    ReferenceCacheMixin,
+    reference_cache,
+)
+from api.matching import ingredient_index
+from api.overlay import RecipeOverlayMixin
+from api.profiling import ProfilingMixin, metrics
+from api.utils import (
+    change_counter,
+    change_counters,
+    change_relation,
+    change_relations,
+    get_ids_param,
+    get_limit_param,
+    get_recipes_limit,
+    get_shopping_cart,
+    get_shopping_cart_ingredients,
+)
+from api.paginations import CursorPaginationMixin, CustomPaginator
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
+from rest_framework.views import APIView
 from rest_framework.viewsets import (
     ReadOnlyModelViewSet,
     ModelViewSet,
 )
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from foodgram.db.routers import ReplicaReadMixin
 from api.filters import IngredientFilter, RecipeFilter
 from api.permissions import IsAuthorOrReadOnly
+from api.renderers import (
+    CSVShoppingCartRenderer,
+    PDFShoppingCartRenderer,
+    PrometheusRenderer,
+    ShoppingCartNegotiation,
+    TxtShoppingCartRenderer,
+)
 from api.serializers import (
-    FavoriteSerializer,
     IngredientSerializer,
+    RecipeIdsSerializer,
+    RecipeInfoSerializer,
+    RecipeMatchSerializer,
     RecipeSerializer,
     TagSerializer,
     FollowSerializer,
     UserInfoSerializer,
-    ShoppingCartSerializer,
 )
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.feed import (
+    feed_queryset,
+    subscribe_feed,
+    unsubscribe_feed,
+)
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag
+)
 from users.models import Subscribers, User
 
 
-class UsersViewSet(UserViewSet):
+class UsersViewSet(ProfilingMixin, CursorPaginationMixin, UserViewSet):
     """
     Вьюсет для работы с пользователями и подписками.
     Обработка запросов на создание/получение пользователей и
@@ -40,42 +92,71 @@ class UsersViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = UserInfoSerializer
     pagination_class = CustomPaginator
+    cursor_ordering = ('id',)
     permission_classes = (IsAuthenticatedOrReadOnly,)
     http_method_names = ['get', 'post', 'delete', 'head']
 
     @action(methods=['POST', 'DELETE'],
             detail=True)
     def subscribe(self, request, id):
+        """
+        Подписка/отписка одним запросом INSERT/DELETE ... RETURNING
+        с изменением User.followers_count (см. change_relation).
+        """
         user = request.user
-        author = get_object_or_404(User, id=id)
-        subscription = Subscribers.objects.filter(
-            user=user, author=author)
-
+        if not str(id).isdigit():
+            raise Http404
+        if request.method == 'POST' and user.id == int(id):
+            return Response({'error': 'Невозможно подписаться на себя'},
+                            status=status.HTTP_400_BAD_REQUEST)
         if request.method == 'POST':
-            if subscription.exists():
+            # Некорректный recipes_limit отклоняется до записи подписки
+            get_recipes_limit(request)
+        author = change_relation(
+            Subscribers, user.id, 'author', int(id), 'followers_count',
+            add=request.method == 'POST'
+        )
+        if author is None:
+            get_object_or_404(User.objects.only('id'), id=id)
+            if request.method == 'POST':
                 return Response({'error': 'Вы уже подписаны'},
                                 status=status.HTTP_400_BAD_REQUEST)
-            if user == author:
-                return Response({'error': 'Невозможно подписаться на себя'},
-                                status=status.HTTP_400_BAD_REQUEST)
+            return Response({'error': 'Вы не подписаны на этого пользователя'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if request.method == 'POST':
+            subscribe_feed(user, author)
+            author.is_subscribed = True
             serializer = FollowSerializer(
                 author,
                 context={'request': request}
             )
-            Subscribers.objects.create(user=user, author=author)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if request.method == 'DELETE':
-            if subscription.exists():
-                subscription.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            return Response({'error': 'Вы не подписаны на этого пользователя'},
-                            status=status.HTTP_400_BAD_REQUEST)
+        unsubscribe_feed(user, author)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
+        """
+        Подписки пользователя. Количество рецептов хранится в
+        User.recipes_count, первые recipes_limit рецептов каждого автора
+        загружаются одним запросом с коррелированным подзапросом LIMIT.
+        """
         user = request.user
-        follows = User.objects.filter(following__user=user)
+        recipes = Recipe.objects.all()
+        recipes_limit = get_recipes_limit(request)
+        if recipes_limit:
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('id')[:recipes_limit]
+            ))
+        follows = User.objects.filter(following__user=user).annotate(
+            is_subscribed=Value(True)
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        ).order_by('id')
         page = self.paginate_queryset(follows)
         serializer = FollowSerializer(
             page, many=True,
@@ -83,8 +164,12 @@ class UsersViewSet(UserViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(
+    ProfilingMixin, ReferenceCacheMixin, ReplicaReadMixin,
+    ReadOnlyModelViewSet
+):
     """Вьюсет для обработки запросов на получение ингредиентов."""
+    cache_namespace = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
@@ -92,16 +177,54 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     permission_classes = (AllowAny,)
     pagination_class = None
 
+    def filter_queryset(self, queryset):
+        """?limit= ограничивает число подсказок после всех фильтров."""
+        queryset = super().filter_queryset(queryset)
+        if self.action != 'list':
+            return queryset
+        limit = get_limit_param(self.request, 'limit')
+        return queryset[:limit] if limit else queryset
 
-class TagViewSet(ReadOnlyModelViewSet):
+
+class TagViewSet(
+    ProfilingMixin, ReferenceCacheMixin, ReplicaReadMixin,
+    ReadOnlyModelViewSet
+):
     """Вьюсет для обработки запросов на получение тегов."""
+    cache_namespace = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
 
-class RecipeViewSet(ModelViewSet):
+class ReferenceCacheStatsView(APIView):
+    """Метрики кеша справочников текущего процесса."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(reference_cache.stats())
+
+
+class MetricsView(APIView):
+    """
+    Агрегированные метрики эндпоинтов текущего процесса
+    (ProfilingMiddleware): JSON или ?format=prometheus.
+    """
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (JSONRenderer, PrometheusRenderer)
+
+    def get(self, request):
+        return Response(metrics.snapshot())
+
+
+class RecipeViewSet(
+    ProfilingMixin,
+    AnonymousResponseCacheMixin,
+    RecipeOverlayMixin,
+    CursorPaginationMixin,
+    ModelViewSet
+):
     """
     Вьюсет для работы с рецептами.
     Обработка запросов создания/получения/редактирования/удаления рецептов
@@ -115,45 +238,254 @@ class RecipeViewSet(ModelViewSet):
     pagination_class = CustomPaginator
     http_method_names = ['get', 'post', 'put', 'patch', 'delete']
 
-    def action_post_delete(self, pk, serializer_class):
+    def get_queryset(self):
+        """
+        Флаги is_favorited/is_in_shopping_cart/is_subscribed считаются
+        подзапросами Exists, связанные объекты подгружаются заранее,
+        поэтому число запросов не зависит от размера страницы.
+        """
         user = self.request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        object = serializer_class.Meta.model.objects.filter(
-            user=user, recipe=recipe
+        queryset = Recipe.objects.prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredient',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            )
         )
-
-        if self.request.method == 'POST':
-            serializer = serializer_class(
-                data={'user': user.id, 'recipe': pk},
-                context={'request': self.request}
+        if not user.is_authenticated:
+            return queryset.select_related('author')
+        return queryset.prefetch_related(
+            Prefetch(
+                'author',
+                queryset=User.objects.annotate(
+                    is_subscribed=Exists(Subscribers.objects.filter(
+                        user=user, author=OuterRef('pk')))
+                )
             )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        ).annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')))
+        )
+
+    def get_cache_dependencies(self, data):
+        """
+        Ответ зависит от версий показанных рецептов и их авторов,
+        справочников и, для списка, от общего набора рецептов.
+        """
+        recipes = [data]
+        namespaces = ['tags', 'ingredients']
+        if self.action == 'list':
+            recipes = data['results'] if isinstance(data, dict) else data
+            namespaces.append('recipes')
+        for recipe in recipes:
+            namespaces.append(f'recipe:{recipe["id"]}')
+            namespaces.append(f'author:{recipe["author"]["id"]}')
+        return namespaces
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        change_counter(User, instance.author_id, 'recipes_count', -1)
 
-        if self.request.method == 'DELETE':
-            if object.exists():
-                object.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
+    def action_post_delete(self, pk, model, counter):
+        """
+        Добавление/удаление рецепта одним запросом INSERT/DELETE ...
+        RETURNING с изменением счетчика (см. change_relation).
+        Повторный запрос не меняет данных и возвращает 400.
+        """
+        user = self.request.user
+        if not str(pk).isdigit():
+            raise Http404
+        recipe = change_relation(
+            model, user.id, 'recipe', int(pk), counter,
+            add=self.request.method == 'POST'
+        )
+        if recipe is None:
+            get_object_or_404(Recipe.objects.only('id'), pk=pk)
+            if self.request.method == 'POST':
+                return Response({'error': 'Этот рецепт уже добавлен'},
+                                status=status.HTTP_400_BAD_REQUEST)
             return Response({'error': 'Этого рецепта нет в списке'},
                             status=status.HTTP_400_BAD_REQUEST)
 
+        if self.request.method == 'POST':
+            serializer = RecipeInfoSerializer(
+                recipe, context={'request': self.request}
+            )
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     @action(methods=['POST', 'DELETE'], detail=True)
     def favorite(self, request, pk):
-        return self.action_post_delete(pk, FavoriteSerializer)
+        return self.action_post_delete(
+            pk, Favorite, 'favorites_count'
+        )
 
     @action(methods=['POST', 'DELETE'], detail=True)
     def shopping_cart(self, request, pk):
-        return self.action_post_delete(pk, ShoppingCartSerializer)
+        return self.action_post_delete(
+            pk, ShoppingCart, 'in_carts_count'
+        )
+
+    def bulk_change(self, request, model, counter):
+        """
+        Массовое добавление (POST) или удаление (DELETE) рецептов из
+        {"recipes": [id, ...]}: один запрос проверяет все id и текущее
+        состояние, затем INSERT ... ON CONFLICT DO NOTHING или DELETE
+        и один UPDATE счетчиков только для действительно измененных
+        строк (см. change_relations). Результат возвращается для
+        каждого id.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['recipes']
+        user = request.user
+        add = request.method == 'POST'
+        related = dict(Recipe.objects.filter(pk__in=ids).annotate(
+            related=Exists(model.objects.filter(
+                user=user, recipe=OuterRef('pk')))
+        ).order_by().values_list('id', 'related'))
+        candidates = [
+            pk for pk in ids if pk in related and related[pk] != add
+        ]
+        changed = set()
+        if candidates:
+            changed = change_relations(
+                model, user.id, 'recipe', candidates, counter, add
+            )
+        statuses = ('added', 'exists') if add else ('removed', 'absent')
+        return Response({'results': [
+            {
+                'id': pk,
+                'status': (
+                    'not_found' if pk not in related
+                    else statuses[0] if pk in changed
+                    else statuses[1]
+                ),
+            }
+            for pk in ids
+        ]})
+
+    @action(methods=['POST', 'DELETE'], detail=False,
+            url_path='favorite/bulk', permission_classes=[IsAuthenticated])
+    def favorite_bulk(self, request):
+        return self.bulk_change(
+            request, Favorite, 'favorites_count'
+        )
+
+    @action(methods=['POST', 'DELETE'], detail=False,
+            url_path='shopping_cart/bulk',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_bulk(self, request):
+        return self.bulk_change(
+            request, ShoppingCart, 'in_carts_count'
+        )
+
+    @action(methods=['DELETE'], detail=False,
+            url_path='shopping_cart/clear',
+            permission_classes=[IsAuthenticated])
+    def clear_shopping_cart(self, request):
+        """Очистка списка покупок пользователя."""
+        user = request.user
+        ids = list(ShoppingCart.objects.filter(
+            user=user
+        ).values_list('recipe_id', flat=True))
+        if not ids:
+            return Response({'error': 'Список покупок пуст'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            ShoppingCart.objects.filter(user=user, recipe_id__in=ids).delete()
+            change_counters(Recipe, ids, 'in_carts_count', -1)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(
+        detail=False, methods=['GET'], permission_classes=[IsAuthenticated]
+    )
+    def feed(self, request):
+        """
+        Лента рецептов авторов, на которых подписан пользователь.
+        Читается из FeedEntry по индексу (user, pub_date), поэтому
+        стоимость страницы не зависит от числа подписок
+        (см. recipes.feed.feed_queryset).
+        """
+        queryset = feed_queryset(
+            self.filter_queryset(self.get_queryset()), request.user
+        ).order_by('-feed_date', '-feed_recipe')
+        self.cursor_ordering = ('-feed_date', '-feed_recipe')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['GET'], permission_classes=[AllowAny])
+    def trending(self, request):
+        """
+        Популярные рецепты по рейтингу из RecipeScore
+        (пересчитывается командой update_trending).
+        Фильтры RecipeFilter применяются так же, как в списке.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            trending__isnull=False
+        ).annotate(
+            trending_score=F('trending__score')
+        ).order_by('-trending_score', '-id')
+        self.cursor_ordering = ('-trending_score', '-id')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['GET'], permission_classes=[AllowAny])
+    def what_to_cook(self, request):
+        """
+        Рецепты, отсортированные по доле ингредиентов из
+        ?ingredients=1,2,3, со списком недостающих ингредиентов.
+        Размер выдачи задается ?limit= (по умолчанию 10, не больше 100).
+        """
+        ingredient_ids = get_ids_param(request, 'ingredients')
+        if not ingredient_ids:
+            return Response({'ingredients': 'Укажите ингредиенты.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        limit = request.query_params.get('limit', '10')
+        if not limit.isdigit() or not 1 <= int(limit) <= 100:
+            return Response({'limit': 'Должно быть числом от 1 до 100.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        matches = ingredient_index.match(ingredient_ids, int(limit))
+        recipes = Recipe.objects.in_bulk(
+            [recipe_id for recipe_id, _, _ in matches]
+        )
+        ingredients = Ingredient.objects.in_bulk(
+            {pk for _, _, missing in matches for pk in missing}
+        )
+        results = [
+            {
+                'recipe': recipes[recipe_id],
+                'match_ratio': ratio,
+                'missing_ingredients': [ingredients[pk] for pk in missing],
+            }
+            for recipe_id, ratio, missing in matches
+            if recipe_id in recipes
+        ]
+        serializer = RecipeMatchSerializer(
+            results, many=True, context={'request': request}
+        )
+        return Response(serializer.data)
 
     @action(
         detail=False,
         methods=['GET'],
         url_path='download_shopping_cart',
         permission_classes=[IsAuthenticated],
+        renderer_classes=[
+            TxtShoppingCartRenderer,
+            CSVShoppingCartRenderer,
+            PDFShoppingCartRenderer,
+        ],
+        content_negotiation_class=ShoppingCartNegotiation,
     )
     def download_shopping_cart(self, request):
-        try:
-            return get_shopping_cart(request)
-        except:
-            return Response(status=status.HTTP_400_BAD_REQUEST)
+        """Выгрузка списка покупок, формат задается ?format=txt|csv|pdf."""
+        ingredients = get_shopping_cart_ingredients(request.user)
+        if not ingredients.exists():
+            return Response({'error': 'Список покупок пуст'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return get_shopping_cart(request, ingredients)
@@ -0,0 +1,68 @@
+from django.db.backends.postgresql import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL-бэкенд для постоянных соединений (CONN_MAX_AGE > 0).
+    CONN_HEALTH_CHECKS: соединение, оставшееся с прошлого HTTP-запроса,
+    проверяется перед первым использованием и при обрыве открывается
+    заново (как в Django 4.1+).
+    STATEMENT_TIMEOUT (мс) при прямом подключении передается параметром
+    options при открытии соединения. Через pgbouncer в режиме transaction
+    (DISABLE_SERVER_SIDE_CURSORS=True) серверное соединение меняется
+    от транзакции к транзакции и параметры сессии на нем не сохраняются,
+    поэтому таймаут ставится SET LOCAL в начале каждой транзакции
+    (atomic); для запросов вне транзакций его задает настройка роли
+    ALTER ROLE ... SET statement_timeout.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+
+    @property
+    def statement_timeout(self):
+        return self.settings_dict.get('STATEMENT_TIMEOUT')
+
+    @property
+    def transaction_pooling(self):
+        return self.settings_dict.get('DISABLE_SERVER_SIDE_CURSORS')
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        if self.statement_timeout and not self.transaction_pooling:
+            params['options'] = ' '.join(filter(None, (
+                params.get('options'),
+                '-c statement_timeout={0}'.format(
+                    int(self.statement_timeout)
+                ),
+            )))
+        return params
+
+    def get_new_connection(self, conn_params):
+        self.health_check_done = True
+        return super().get_new_connection(conn_params)
+
+    def _set_autocommit(self, autocommit):
+        super()._set_autocommit(autocommit)
+        if (not autocommit and self.statement_timeout
+                and self.transaction_pooling):
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    'SET LOCAL statement_timeout = %s',
+                    [self.statement_timeout]
+                )
+
+    def ensure_connection(self):
+        if (self.connection is not None
+                and self.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not self.health_check_done
+                and not self.in_atomic_block):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        """Вызывается в начале и в конце каждого HTTP-запроса."""
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
@@ -0,0 +1,239 @@
+import asyncio
+import contextvars
+import hashlib
+import ipaddress
+import logging
+import random
+import threading
+import time
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_KEY = 'replica:sticky:{client}'
+
+_current_state = contextvars.ContextVar('replica_state', default=None)
+
+
+class ReplicaPool:
+    """
+    Взвешенный случайный выбор реплики из settings.DATABASE_REPLICAS.
+    Реплика, к которой не удалось подключиться, исключается из выбора
+    на REPLICA_ROUTER['RETRY_INTERVAL'] секунд.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._down = {}
+
+    def is_down(self, alias, now):
+        with self._lock:
+            return self._down.get(alias, 0) > now
+
+    def mark_down(self, alias):
+        logger.warning('Реплика %s недоступна, чтение с основной БД', alias)
+        with self._lock:
+            self._down[alias] = (
+                time.monotonic() + settings.REPLICA_ROUTER['RETRY_INTERVAL']
+            )
+
+    def is_healthy(self, alias):
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            self.mark_down(alias)
+            return False
+        return True
+
+    def choose(self):
+        """Реплика для чтения или None, если доступных реплик нет."""
+        now = time.monotonic()
+        candidates = {
+            alias: weight
+            for alias, weight in settings.DATABASE_REPLICAS.items()
+            if weight > 0 and not self.is_down(alias, now)
+        }
+        while candidates:
+            alias = random.choices(
+                list(candidates), weights=list(candidates.values())
+            )[0]
+            if self.is_healthy(alias):
+                return alias
+            del candidates[alias]
+        return None
+
+
+replicas = ReplicaPool()
+
+
+@lru_cache(maxsize=None)
+def get_trusted_proxies(proxies):
+    return tuple(
+        ipaddress.ip_network(proxy.strip(), strict=False)
+        for proxy in proxies if proxy.strip()
+    )
+
+
+def is_trusted_proxy(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in get_trusted_proxies(
+        tuple(settings.REPLICA_ROUTER['TRUSTED_PROXIES'])
+    ))
+
+
+def get_client_ip(request):
+    """
+    IP-адрес клиента. Если запрос пришел от доверенного прокси
+    (REPLICA_ROUTER['TRUSTED_PROXIES']), адрес берется из
+    X-Forwarded-For: первый справа, не принадлежащий доверенным прокси.
+    Заголовок от остальных адресов игнорируется, так как его может
+    подставить сам клиент.
+    """
+    address = request.META.get('REMOTE_ADDR', '')
+    if not is_trusted_proxy(address):
+        return address
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    for address in reversed([
+        value.strip() for value in forwarded.split(',') if value.strip()
+    ]):
+        if not is_trusted_proxy(address):
+            return address
+    return address
+
+
+def get_client_keys(request):
+    """
+    Ключи меток записи клиента: по токену из заголовка Authorization
+    и по IP-адресу. Метка по IP покрывает запросы без токена
+    (регистрация, получение токена) и первые запросы с новым токеном.
+    """
+    clients = [get_client_ip(request)]
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if authorization:
+        clients.append(hashlib.md5(authorization.encode()).hexdigest())
+    return [STICKY_KEY.format(client=client) for client in clients]
+
+
+class ReplicaState:
+    """Маршрутизация чтения в рамках одного HTTP-запроса."""
+    def __init__(self, request):
+        self.read_only = request.method in SAFE_METHODS
+        self.keys = get_client_keys(request)
+        self.wrote = False
+        self._sticky = None
+        self._alias = None
+
+    @property
+    def backend(self):
+        return caches[settings.REPLICA_ROUTER['CACHE_ALIAS']]
+
+    @property
+    def sticky(self):
+        """Клиент недавно писал в БД; проверяется при первом чтении."""
+        if self._sticky is None:
+            self._sticky = bool(self.backend.get_many(self.keys))
+        return self._sticky
+
+    def mark_written(self):
+        self.backend.set_many(
+            dict.fromkeys(self.keys, 1),
+            settings.REPLICA_ROUTER['STICKY_TIMEOUT']
+        )
+
+    def read_alias(self, sticky=True):
+        if (not self.read_only or self.wrote
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block
+                or sticky and self.sticky):
+            return DEFAULT_DB_ALIAS
+        if self._alias is None:
+            self._alias = replicas.choose() or DEFAULT_DB_ALIAS
+        return self._alias
+
+
+class ReplicaRouter:
+    """
+    Чтение в безопасных HTTP-запросах идет на реплику, выбранную
+    один раз на запрос. Запись, чтение внутри транзакции, чтение
+    после записи в том же запросе и запросы клиента, писавшего в БД
+    в последние STICKY_TIMEOUT секунд, идут в основную БД, как
+    и все запросы вне HTTP (команды manage.py, фоновые потоки).
+    """
+    def db_for_read(self, model, **hints):
+        state = _current_state.get()
+        if state is None:
+            return None
+        return state.read_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _current_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Все базы содержат одни и те же данные."""
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware(MiddlewareMixin):
+    """
+    Включает ReplicaRouter для запроса и после небезопасного запроса
+    или записи через ORM ставит метку клиента в кеш (запись сырым SQL
+    через connection роутер не видит). Работает при заданных DB_REPLICAS.
+    """
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        state = ReplicaState(request)
+        token = _current_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_state.reset(token)
+        if state.wrote or not state.read_only:
+            state.mark_written()
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        state = ReplicaState(request)
+        token = _current_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_state.reset(token)
+        if state.wrote or not state.read_only:
+            await sync_to_async(state.mark_written, thread_sensitive=False)()
+        return response
+
+
+class ReplicaReadMixin:
+    """
+    Миксин для read-only вьюсетов справочников: их queryset читается
+    с реплики и сразу после записи клиента, так как теги и ингредиенты
+    меняются только через админку и команды загрузки.
+    """
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        state = _current_state.get()
+        if state is None:
+            return queryset
+        return queryset.using(state.read_alias(sticky=False))
@@ -40,6 +40,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.profiling.ProfilingMiddleware',
+    'foodgram.db.routers.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -73,17 +75,155 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# ENGINE foodgram.db.postgresql добавляет к стандартному бэкенду
+# проверку постоянных соединений и statement_timeout.
+# При работе через pgbouncer в режиме transaction нужно
+# DB_DISABLE_SERVER_SIDE_CURSORS=True (см. infra/docker-compose.yml):
+# тогда statement_timeout ставится SET LOCAL в транзакциях, а для
+# остальных запросов - настройкой роли на сервере PostgreSQL.
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
+        'ENGINE': os.getenv('DB_ENGINE', default='foodgram.db.postgresql'),
         'NAME': os.getenv('DB_NAME', default='postgres'),
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('DB_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('DB_CONN_HEALTH_CHECKS', default='True') == 'True'
+        ),
+        'STATEMENT_TIMEOUT': int(
+            os.getenv('DB_STATEMENT_TIMEOUT', default=30000)
+        ),
+        'DISABLE_SERVER_SIDE_CURSORS': (
+            os.getenv('DB_DISABLE_SERVER_SIDE_CURSORS', default='False')
+            == 'True'
+        ),
     }
 }
 
+if 'postgresql' in DATABASES['default']['ENGINE']:
+    DATABASES['default']['OPTIONS'] = {
+        'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', default=5)),
+        'keepalives': 1,
+        'keepalives_idle': 60,
+    }
+
+# Реплики для чтения: DB_REPLICAS="db-replica-1=3,db-replica-2:5433=1" -
+# хосты (для SQLite - пути к файлам БД) и веса после '='. Безопасные
+# запросы (GET, HEAD, OPTIONS) читают с реплик; клиент, писавший в БД,
+# STICKY_TIMEOUT секунд читает с основной БД. Реплика, к которой
+# не удалось подключиться, исключается на RETRY_INTERVAL секунд.
+# Клиент определяется по токену и IP-адресу: если запрос пришел
+# от прокси из TRUSTED_PROXIES (адреса и подсети; по умолчанию
+# локальные сети docker), IP берется из X-Forwarded-For.
+# Для нескольких воркеров CACHES[CACHE_ALIAS] должен быть общим.
+DATABASE_REPLICAS = {}
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(',')), 1
+):
+    location, _, weight = replica.strip().partition('=')
+    alias = f'replica_{number}'
+    DATABASES[alias] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if 'sqlite3' in DATABASES[alias]['ENGINE']:
+        DATABASES[alias]['NAME'] = location
+    else:
+        host, _, port = location.partition(':')
+        DATABASES[alias]['HOST'] = host
+        DATABASES[alias]['PORT'] = port or DATABASES['default']['PORT']
+    DATABASE_REPLICAS[alias] = int(weight or 1)
+
+DATABASE_ROUTERS = ['foodgram.db.routers.ReplicaRouter']
+
+REPLICA_ROUTER = {
+    'STICKY_TIMEOUT': int(os.getenv('DB_REPLICA_STICKY_TIMEOUT', default=5)),
+    'RETRY_INTERVAL': int(os.getenv('DB_REPLICA_RETRY_INTERVAL', default=30)),
+    'TRUSTED_PROXIES': os.getenv(
+        'DB_REPLICA_TRUSTED_PROXIES',
+        default='127.0.0.1,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16'
+    ).split(','),
+    'CACHE_ALIAS': 'default',
+}
+
+# Кеши справочников и ответов, флаги пользователей, журнал индекса
+# ингредиентов и привязка клиентов к основной БД должны быть общими для
+# всех воркеров gunicorn (их число задает WEB_CONCURRENCY, эту же
+# переменную читает gunicorn). При REDIS_URL используется Redis, иначе
+# CACHE_BACKEND (по умолчанию кеш в памяти процесса); с таким кешем
+# при WEB_CONCURRENCY > 1 приложение не запускается (api.checks).
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', default=1))
+REDIS_URL = os.getenv('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+            'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+        }
+    }
+
+# Кеш справочников (теги, ингредиенты): LRU в памяти процесса и,
+# при REFERENCE_CACHE_SHARED=True, общий кеш CACHES[CACHE_ALIAS].
+# Версии справочников и журнал изменений индекса ингредиентов
+# (api.matching) всегда хранятся в CACHES[CACHE_ALIAS], для нескольких
+# воркеров gunicorn это должен быть общий бэкенд: иначе воркеры
+# отдают устаревшие данные (manage.py check --deploy предупреждает).
+REFERENCE_CACHE = {
+    'MAX_ENTRIES': int(os.getenv('REFERENCE_CACHE_MAX_ENTRIES', default=256)),
+    'TIMEOUT': int(os.getenv('REFERENCE_CACHE_TIMEOUT', default=300)),
+    'SHARED': os.getenv('REFERENCE_CACHE_SHARED', default='False') == 'True',
+    'CACHE_ALIAS': 'default',
+}
+
+# Кеш ответов /api/recipes/ для анонимных пользователей. TIMEOUT -
+# сколько секунд запись свежая (ограничивает задержку в порядке
+# сортировки по счетчикам), STALE_TIMEOUT - сколько еще ее можно
+# отдавать, пока другой запрос строит новую. Для нескольких воркеров
+# CACHES[CACHE_ALIAS] должен быть общим бэкендом.
+RESPONSE_CACHE = {
+    'ENABLED': os.getenv('RESPONSE_CACHE_ENABLED', default='True') == 'True',
+    'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT', default=60)),
+    'STALE_TIMEOUT': int(
+        os.getenv('RESPONSE_CACHE_STALE_TIMEOUT', default=300)
+    ),
+    'LOCK_TIMEOUT': 10,
+    'WAIT': 2,
+    'CACHE_ALIAS': 'default',
+}
+
+# Ответы /api/recipes/ для авторизованных пользователей собираются
+# из общих фрагментов рецептов и флагов пользователя (множества id
+# избранного, списка покупок и подписок) из CACHES[CACHE_ALIAS].
+RECIPE_OVERLAY = {
+    'ENABLED': os.getenv('RECIPE_OVERLAY_ENABLED', default='True') == 'True',
+    'FRAGMENT_TIMEOUT': int(
+        os.getenv('RECIPE_FRAGMENT_TIMEOUT', default=600)
+    ),
+    'STATE_TIMEOUT': int(os.getenv('USER_STATE_TIMEOUT', default=300)),
+    'CACHE_ALIAS': 'default',
+}
+
+# Асинхронный режим под ASGI (foodgram/asgi.py включает его по
+# умолчанию): списки и карточки рецептов, теги, ингредиенты и подписки
+# выполняются в пуле из WORKERS потоков, не занимая цикл событий.
+# У каждого потока свое соединение с БД.
+ASYNC_VIEWS = {
+    'ENABLED': os.getenv('ASYNC_VIEWS_ENABLED', default='False') == 'True',
+    'WORKERS': int(os.getenv('ASYNC_VIEWS_WORKERS', default=8)),
+}
+
+# Максимум рецептов в одном запросе массового добавления в избранное
+# и список покупок (/api/recipes/favorite/bulk/ и т.п.).
+BULK_RECIPES_LIMIT = int(os.getenv('BULK_RECIPES_LIMIT', default=100))
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -128,6 +268,78 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
+# Максимальный размер декодированного изображения рецепта (base64).
+# Лимит тела запроса рассчитывается так, чтобы пропустить такое
+# изображение в base64 вместе с остальными полями рецепта.
+MAX_IMAGE_UPLOAD_SIZE = int(os.getenv('MAX_IMAGE_UPLOAD_SIZE', default=5 * 1024 * 1024))
+
+DATA_UPLOAD_MAX_MEMORY_SIZE = MAX_IMAGE_UPLOAD_SIZE * 4 // 3 + 1024 * 1024
+
+# Фоновая обработка изображений рецептов: уменьшенные копии
+# в форматах WEBP/AVIF (AVIF - если его поддерживает сборка Pillow).
+# При IMAGE_PIPELINE_WORKERS=0 обработка идет синхронно в запросе.
+IMAGE_PIPELINE = {
+    'WORKERS': int(os.getenv('IMAGE_PIPELINE_WORKERS', default=2)),
+    'SIZES': {'thumbnail': 320, 'medium': 960},
+    'FORMATS': ('WEBP', 'AVIF'),
+    'QUALITY': int(os.getenv('IMAGE_PIPELINE_QUALITY', default=80)),
+    'UPLOAD_TO': 'recipes/variants/',
+}
+
+# Профилирование запросов к API (ProfilingMiddleware): заголовок
+# Server-Timing и метрики /api/_metrics/. Бюджеты задаются для
+# '<Вьюсет>.<action>'; при превышении пишется предупреждение в лог,
+# а при PROFILING_RAISE_ON_BUDGET=True (в тестах) - исключение.
+PROFILING = {
+    'ENABLED': os.getenv('PROFILING_ENABLED', default='False') == 'True',
+    'RAISE_ON_BUDGET': (
+        os.getenv('PROFILING_RAISE_ON_BUDGET', default='False') == 'True'
+    ),
+    'DEFAULT_QUERY_BUDGET': None,
+    'QUERY_BUDGETS': {
+        'RecipeViewSet.list': 7,
+        'RecipeViewSet.retrieve': 6,
+        'RecipeViewSet.feed': 12,
+        'RecipeViewSet.trending': 8,
+        'RecipeViewSet.favorite_bulk': 6,
+        'RecipeViewSet.shopping_cart_bulk': 6,
+        'UsersViewSet.subscriptions': 6,
+        'TagViewSet.list': 3,
+        'IngredientViewSet.list': 3,
+    },
+}
+
+# Лента подписок (/api/recipes/feed/). Рецепты авторов, у которых
+# подписчиков больше FEED_FANOUT_LIMIT, не раскладываются по лентам
+# при публикации, а объединяются с лентой подписчика при чтении.
+# BACKFILL - сколько последних рецептов автора попадает в ленту
+# при подписке и когда автор опускается до FEED_FANOUT_LIMIT.
+FEED = {
+    'FANOUT_LIMIT': int(os.getenv('FEED_FANOUT_LIMIT', default=1000)),
+    'BACKFILL': int(os.getenv('FEED_BACKFILL', default=50)),
+    'BATCH_SIZE': 1000,
+}
+
+# Популярные рецепты (/api/recipes/trending/), пересчет командой
+# update_trending: вес событий и период полураспада оценки в часах.
+# SETTLE_SECONDS - события младше этого возраста учитываются следующим
+# запуском: так не теряются строки транзакций, закоммиченных позже.
+TRENDING = {
+    'HALF_LIFE_HOURS': float(os.getenv('TRENDING_HALF_LIFE_HOURS', default=48)),
+    'SETTLE_SECONDS': int(os.getenv('TRENDING_SETTLE_SECONDS', default=300)),
+    'FAVORITE_WEIGHT': 2.0,
+    'CART_WEIGHT': 1.0,
+    'MIN_SCORE': 0.01,
+    'BATCH_SIZE': 1000,
+}
+
+# TTF-шрифт с кириллицей для выгрузки списка покупок в PDF,
+# по умолчанию DejaVu Sans из api/fonts (лицензия в api/fonts/LICENSE)
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default=str(BASE_DIR / 'api' / 'fonts' / 'DejaVuSans.ttf')
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,10 @@
+"""
+Настройки для тестов: python manage.py test --settings=foodgram.test_settings.
+Добавляют реплику для тестов роутера (api.tests.test_replicas) -
+зеркало тестовой основной БД. Чтение с нее включается только в этих
+тестах через DATABASE_REPLICAS.
+"""
+from foodgram.settings import *  # noqa: F401, F403
+from foodgram.settings import DATABASES
+
+DATABASES['replica'] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
@@ -5,6 +5,7 @@ from recipes.models import (
     Tag,
     IngredientRecipe,
     Favorite,
+    RecipeScore,
     ShoppingCart
 )
 
@@ -17,7 +18,9 @@ class RecipeInline(admin.TabularInline):
 class RecipeAdmin(admin.ModelAdmin):
     list_display = (
         'name',
-        'author'
+        'author',
+        'favorites_count',
+        'in_carts_count'
     )
     list_filter = (
         'author',
@@ -70,3 +73,12 @@ class IngredientInRecipeAdmin(admin.ModelAdmin):
         'ingredient',
         'amount'
     )
+
+
+@admin.register(RecipeScore)
+class RecipeScoreAdmin(admin.ModelAdmin):
+    list_display = (
+        'recipe',
+        'score',
+        'updated'
+    )
@@ -0,0 +1,102 @@
+from django.conf import settings
+from django.db.models import F
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscribers
+
+
+def add_entries(user_ids, recipes):
+    """Добавляет пары (подписчик, рецепт) в ленты, дубли пропускаются."""
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for user_id in user_ids
+            for recipe_id, pub_date in recipes
+        ],
+        batch_size=settings.FEED['BATCH_SIZE'],
+        ignore_conflicts=True
+    )
+
+
+def is_fanned_out(author):
+    return author.followers_count <= settings.FEED['FANOUT_LIMIT']
+
+
+def fan_out_recipe(recipe):
+    """
+    Раскладывает новый рецепт по лентам подписчиков автора.
+    Для авторов с большим числом подписчиков ничего не делает,
+    их рецепты подтягивает feed_queryset.
+    """
+    if not is_fanned_out(recipe.author):
+        return
+    followers = Subscribers.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('user_id', flat=True)
+    add_entries(followers, [(recipe.pk, recipe.pub_date)])
+
+
+def subscribe_feed(user, author):
+    """Последние рецепты автора в ленту нового подписчика."""
+    recipes = Recipe.objects.filter(author=author).values_list(
+        'id', 'pub_date'
+    )[:settings.FEED['BACKFILL']]
+    add_entries([user.pk], recipes)
+
+
+def backfill_followers(author):
+    """
+    Последние рецепты автора в ленты всех его подписчиков. Нужна, когда
+    автор опускается до FEED['FANOUT_LIMIT'] подписчиков: рецепты,
+    опубликованные, пока их подтягивал feed_queryset, в ленты не
+    раскладывались.
+    """
+    followers = Subscribers.objects.filter(
+        author=author
+    ).values_list('user_id', flat=True)
+    recipes = Recipe.objects.filter(author=author).values_list(
+        'id', 'pub_date'
+    )[:settings.FEED['BACKFILL']]
+    add_entries(followers, recipes)
+
+
+def unsubscribe_feed(user, author):
+    """
+    Убирает рецепты автора из ленты; author.followers_count - значение
+    после отписки.
+    """
+    FeedEntry.objects.filter(user=user, recipe__author=author).delete()
+    if author.followers_count == settings.FEED['FANOUT_LIMIT']:
+        backfill_followers(author)
+
+
+def large_authors(user):
+    """Подписки на авторов, рецепты которых не раскладываются по лентам."""
+    return Subscribers.objects.filter(
+        user=user,
+        author__followers_count__gt=settings.FEED['FANOUT_LIMIT']
+    ).values('author_id')
+
+
+def feed_queryset(queryset, user):
+    """
+    Лента пользователя, аннотированная feed_date и feed_recipe.
+    Обычно читается из FeedEntry по индексу (user, pub_date). Если
+    пользователь подписан на авторов с большим числом подписчиков,
+    их рецепты объединяются с FeedEntry при чтении (fan-out on read),
+    без записи в ленту или кеш.
+    """
+    authors = large_authors(user)
+    if not authors.exists():
+        return queryset.filter(feed_entries__user=user).annotate(
+            feed_date=F('feed_entries__pub_date'),
+            feed_recipe=F('feed_entries__recipe')
+        )
+    entries = FeedEntry.objects.filter(
+        user=user
+    ).order_by().values('recipe_id')
+    pulled = Recipe.objects.filter(
+        author__in=authors
+    ).order_by().values('id')
+    return queryset.filter(id__in=entries.union(pulled)).annotate(
+        feed_date=F('pub_date'), feed_recipe=F('id')
+    )
@@ -0,0 +1,121 @@
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps, features
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Отправляется после записи вариантов изображения рецепта: UPDATE
+# через queryset не вызывает post_save, а кеши ответов нужно сбросить
+variants_saved = Signal()
+
+FORMAT_FEATURES = {
+    'WEBP': 'webp',
+    'AVIF': 'avif',
+}
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    """Пул потоков создается при первой задаче в каждом процессе."""
+    return ThreadPoolExecutor(
+        max_workers=settings.IMAGE_PIPELINE['WORKERS'],
+        thread_name_prefix='recipe-images'
+    )
+
+
+def get_formats():
+    """Форматы вариантов, которые поддерживает установленный Pillow."""
+    return [
+        image_format for image_format in settings.IMAGE_PIPELINE['FORMATS']
+        if features.check(FORMAT_FEATURES[image_format])
+    ]
+
+
+def save_variant(image, image_format):
+    """Сохраняет вариант под именем из хеша содержимого."""
+    buffer = io.BytesIO()
+    image.save(
+        buffer,
+        format=image_format,
+        quality=settings.IMAGE_PIPELINE['QUALITY']
+    )
+    content = buffer.getvalue()
+    digest = hashlib.sha256(content).hexdigest()[:32]
+    name = '{0}{1}.{2}'.format(
+        settings.IMAGE_PIPELINE['UPLOAD_TO'], digest, image_format.lower()
+    )
+    if default_storage.exists(name):
+        return name
+    return default_storage.save(name, ContentFile(content))
+
+
+def build_variants(file):
+    """
+    Уменьшенные копии изображения без метаданных (EXIF и т.п.
+    не переносятся при перекодировании) во всех доступных форматах.
+    Возвращает словарь {'<размер>_<формат>': путь в хранилище}.
+    """
+    with Image.open(file) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    variants = {}
+    for size_name, size in settings.IMAGE_PIPELINE['SIZES'].items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        for image_format in get_formats():
+            key = '{0}_{1}'.format(size_name, image_format.lower())
+            variants[key] = save_variant(resized, image_format)
+    return variants
+
+
+def process_recipe_image(recipe_id, image_name):
+    """
+    Строит варианты изображения рецепта и сохраняет их пути.
+    Если изображение рецепта успело смениться, результат не записывается.
+    """
+    try:
+        with default_storage.open(image_name) as file:
+            variants = build_variants(file)
+        updated = Recipe.objects.filter(
+            pk=recipe_id, image=image_name
+        ).update(image_variants=variants)
+        if updated:
+            variants_saved.send(sender=Recipe, recipe_id=recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось обработать изображение рецепта %s', recipe_id
+        )
+
+
+def process_in_worker(recipe_id, image_name):
+    """Задача пула: у потока свое соединение с БД, его нужно закрыть."""
+    try:
+        process_recipe_image(recipe_id, image_name)
+    finally:
+        connection.close()
+
+
+def schedule_recipe_image(recipe):
+    """
+    Ставит обработку изображения в пул потоков после коммита транзакции.
+    При IMAGE_PIPELINE_WORKERS=0 обработка выполняется синхронно.
+    """
+    recipe_id, image_name = recipe.pk, recipe.image.name
+
+    def submit():
+        if settings.IMAGE_PIPELINE['WORKERS']:
+            get_executor().submit(process_in_worker, recipe_id, image_name)
+        else:
+            process_recipe_image(recipe_id, image_name)
+
+    transaction.on_commit(submit)
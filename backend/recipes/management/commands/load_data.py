@@ -1,13 +1,114 @@
+import csv
 import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management import BaseCommand
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
 from recipes.models import Ingredient
+from api.cache import reference_cache
+
+CSV_HEADER = ['name', 'measurement_unit']
+
+
+def iter_json(file, chunk_size=64 * 1024):
+    """
+    Потоковое чтение JSON-массива объектов (или JSON Lines)
+    без загрузки всего файла в память.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while True:
+        chunk = file.read(chunk_size)
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+                position += 1
+            try:
+                row, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield row
+        buffer = buffer[position:]
+        if not chunk:
+            if buffer.strip():
+                raise CommandError('Некорректный JSON в конце файла.')
+            return
+
+
+def iter_csv(file):
+    """CSV из двух колонок: название и единица измерения."""
+    for row in csv.reader(file):
+        if not row or row == CSV_HEADER:
+            continue
+        if len(row) != 2:
+            raise CommandError(f'Некорректная строка CSV: {row}')
+        yield dict(zip(CSV_HEADER, row))
 
 
 class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты из JSON или CSV пакетами bulk_create. '
+        'Уже существующие ингредиенты пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=str(Path(settings.BASE_DIR) / 'data' / 'ingredients.json'),
+            help='Файл .json или .csv с ингредиентами.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество строк в одном INSERT.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только прочитать файл, ничего не записывая.'
+        )
+
     def handle(self, *args, **options):
-        with open('data/ingredients.json', encoding='utf-8',
-                  ) as data_file_ingredients:
-            ingredient_data = json.loads(data_file_ingredients.read())
-            for ingredients in ingredient_data:
-                Ingredient.objects.get_or_create(**ingredients)
+        path = Path(options['path'])
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        if path.suffix.lower() not in ('.json', '.csv'):
+            raise CommandError('Поддерживаются только файлы .json и .csv.')
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден.')
+        started = time.monotonic()
+        before = Ingredient.objects.count()
+        total = 0
+        with path.open(encoding='utf-8', newline='') as file:
+            rows = (
+                iter_csv(file) if path.suffix.lower() == '.csv'
+                else iter_json(file)
+            )
+            while True:
+                batch = [
+                    Ingredient(
+                        name=row['name'],
+                        measurement_unit=row['measurement_unit']
+                    )
+                    for row in islice(rows, options['batch_size'])
+                ]
+                if not batch:
+                    break
+                total += len(batch)
+                if not options['dry_run']:
+                    Ingredient.objects.bulk_create(
+                        batch, ignore_conflicts=True
+                    )
+        created = Ingredient.objects.count() - before
+        if created:
+            reference_cache.invalidate('ingredients')
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано строк: {total}, добавлено: {created}, '
+            f'{total / elapsed:.0f} строк/с'
+            + (' (dry run)' if options['dry_run'] else '')
+        ))
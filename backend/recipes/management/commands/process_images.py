@@ -0,0 +1,27 @@
+from django.core.management import BaseCommand
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит уменьшенные копии изображений рецептов, для которых '
+        'они еще не созданы (или для всех с --all).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать варианты для всех рецептов.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        processed = 0
+        for recipe_id, image_name in recipes.values_list('id', 'image'):
+            process_recipe_image(recipe_id, image_name)
+            processed += 1
+        self.stdout.write(f'Обработано изображений: {processed}')
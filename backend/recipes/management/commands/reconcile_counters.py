@@ -0,0 +1,52 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.core.management import BaseCommand
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscribers, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscribers, 'author'),
+)
+
+
+def count_subquery(model, field):
+    """Фактическое количество связанных строк для OuterRef('pk')."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счетчики (избранное, списки '
+        'покупок, количество рецептов и подписчиков) и исправляет '
+        'расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать количество расхождений.'
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model, counter, related_model, field in COUNTERS:
+            drifted = model.objects.annotate(
+                actual=count_subquery(related_model, field)
+            ).filter(~Q(**{counter: F('actual')}))
+            ids = list(drifted.values_list('pk', flat=True))
+            if ids and not options['dry_run']:
+                model.objects.filter(pk__in=ids).update(
+                    **{counter: count_subquery(related_model, field)}
+                )
+            self.stdout.write(
+                f'{model.__name__}.{counter}: расхождений {len(ids)}'
+            )
@@ -0,0 +1,210 @@
+import io
+import random
+import time
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import transaction
+from PIL import Image
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag
+)
+from recipes.search import index_recipes
+from users.models import Subscribers, User
+from api.cache import reference_cache
+from api.matching import NAMESPACE
+
+BENCHMARK_IMAGE = 'backend/media/benchmark.png'
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими данными для команды benchmark_api: '
+        'пользователи, рецепты (по умолчанию 1M строк IngredientRecipe), '
+        'избранное, списки покупок и подписки. Данные создаются '
+        'bulk_create, сигналы не отправляются; индекс поиска '
+        'SQLite заполняется отдельно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='bench',
+                            help='Префикс имен синтетических пользователей.')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--ingredients', type=int, default=2000,
+                            help='Сколько ингредиентов создать, если их '
+                                 'в базе меньше.')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=10)
+        parser.add_argument('--favorites', type=int, default=50,
+                            help='Избранных рецептов на пользователя.')
+        parser.add_argument('--cart', type=int, default=10,
+                            help='Рецептов в списке покупок пользователя.')
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Подписок на пользователя.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed генератора случайных чисел.')
+        parser.add_argument('--flush', action='store_true',
+                            help='Удалить данные предыдущего запуска '
+                                 'с тем же префиксом.')
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(
+            objects, batch_size=self.batch_size, ignore_conflicts=True
+        )
+
+    def get_image(self):
+        """
+        Одна картинка на все синтетические рецепты: файл сохраняется
+        в хранилище при первом запуске, дальше используется его имя.
+        """
+        if default_storage.exists(BENCHMARK_IMAGE):
+            return BENCHMARK_IMAGE
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 300), '#E26C2D').save(buffer, 'PNG')
+        return default_storage.save(
+            BENCHMARK_IMAGE, ContentFile(buffer.getvalue())
+        )
+
+    def create_users(self, prefix, count):
+        self.bulk_create(User, [
+            User(
+                username=f'{prefix}{i}',
+                email=f'{prefix}{i}@example.com',
+                first_name='Bench',
+                last_name=str(i),
+                password='!'
+            )
+            for i in range(count)
+        ])
+        return list(User.objects.filter(
+            username__startswith=prefix, email__endswith='@example.com'
+        ).values_list('id', flat=True))
+
+    def get_ingredients(self, count):
+        missing = count - Ingredient.objects.count()
+        if missing > 0:
+            self.bulk_create(Ingredient, [
+                Ingredient(name=f'ingredient {i}', measurement_unit='г')
+                for i in range(missing)
+            ])
+            reference_cache.invalidate('ingredients')
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def get_tags(self):
+        if not Tag.objects.exists():
+            self.bulk_create(Tag, [
+                Tag(name=name, slug=slug, color=color)
+                for name, slug, color in (
+                    ('Завтрак', 'breakfast', '#E26C2D'),
+                    ('Обед', 'lunch', '#49B64E'),
+                    ('Ужин', 'dinner', '#8775D2'),
+                )
+            ])
+            reference_cache.invalidate('tags')
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_recipes(self, user_ids, count, ingredient_ids, tag_ids,
+                       per_recipe):
+        for start in range(0, count, self.batch_size):
+            self.bulk_create(Recipe, [
+                Recipe(
+                    author_id=user_ids[i % len(user_ids)],
+                    name=f'Рецепт {i}',
+                    text='Синтетический рецепт для бенчмарка.',
+                    image=self.image,
+                    cooking_time=self.random.randint(5, 120)
+                )
+                for i in range(start, min(start + self.batch_size, count))
+            ])
+        recipe_ids = list(Recipe.objects.filter(
+            author__username__startswith=self.prefix,
+            author__email__endswith='@example.com'
+        ).order_by('id').values_list('id', flat=True))
+        index_recipes(recipe_ids)
+        for start in range(0, len(recipe_ids), self.batch_size):
+            chunk = recipe_ids[start:start + self.batch_size]
+            self.bulk_create(IngredientRecipe, [
+                IngredientRecipe(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500)
+                )
+                for recipe_id in chunk
+                for ingredient_id in self.random.sample(
+                    ingredient_ids, min(per_recipe, len(ingredient_ids))
+                )
+            ])
+            self.bulk_create(Recipe.tags.through, [
+                Recipe.tags.through(
+                    recipe_id=recipe_id,
+                    tag_id=self.random.choice(tag_ids)
+                )
+                for recipe_id in chunk
+            ])
+        return recipe_ids
+
+    def create_relations(self, model, user_ids, targets, per_user,
+                         target_field):
+        """Случайные связи пользователь -> рецепт или автор."""
+        per_user = min(per_user, len(targets))
+        users_per_batch = max(self.batch_size // max(per_user, 1), 1)
+        for start in range(0, len(user_ids), users_per_batch):
+            self.bulk_create(model, [
+                model(user_id=user_id, **{target_field: target})
+                for user_id in user_ids[start:start + users_per_batch]
+                for target in self.random.sample(targets, per_user)
+                if target != user_id or target_field != 'author_id'
+            ])
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        self.batch_size = options['batch_size']
+        self.random = random.Random(options['seed'])
+        self.prefix = prefix = options['prefix']
+        self.image = self.get_image()
+        started = time.monotonic()
+        with transaction.atomic():
+            existing = User.objects.filter(
+                username__startswith=prefix, email__endswith='@example.com'
+            )
+            if existing.exists():
+                if not options['flush']:
+                    raise CommandError(
+                        f'Данные с префиксом {prefix} уже есть, '
+                        'используйте --flush.'
+                    )
+                existing.delete()
+            user_ids = self.create_users(prefix, options['users'])
+            ingredient_ids = self.get_ingredients(options['ingredients'])
+            tag_ids = self.get_tags()
+            recipe_ids = self.create_recipes(
+                user_ids, options['recipes'], ingredient_ids, tag_ids,
+                options['ingredients_per_recipe']
+            )
+            self.create_relations(
+                Favorite, user_ids, recipe_ids, options['favorites'],
+                'recipe_id'
+            )
+            self.create_relations(
+                ShoppingCart, user_ids, recipe_ids, options['cart'],
+                'recipe_id'
+            )
+            self.create_relations(
+                Subscribers, user_ids, user_ids, options['follows'],
+                'author_id'
+            )
+            call_command('reconcile_counters', stdout=self.stdout)
+        reference_cache.invalidate(NAMESPACE)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(user_ids)}, рецептов: {len(recipe_ids)}, '
+            f'строк IngredientRecipe: {IngredientRecipe.objects.count()}, '
+            f'{time.monotonic() - started:.1f} с'
+        ))
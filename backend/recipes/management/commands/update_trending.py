@@ -0,0 +1,129 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Min
+from django.core.management import BaseCommand
+from django.utils import timezone
+from recipes.models import (
+    Favorite,
+    RecipeScore,
+    ShoppingCart,
+    TrendingState
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинг популярных рецептов. Накопленные оценки '
+        'уменьшаются по экспоненте с периодом полураспада '
+        'TRENDING_HALF_LIFE_HOURS, затем добавляются события избранного и '
+        'списков покупок, добавленные после границы прошлого запуска '
+        '(она хранится в TrendingState и отстает от времени запуска на '
+        'TRENDING_SETTLE_SECONDS). Запускается периодически (cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help=(
+                'Пересчитать рейтинг по всей истории (учитывает удаленные '
+                'из избранного и списков покупок рецепты).'
+            )
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.TRENDING['BATCH_SIZE'],
+            help='Количество строк в одном UPDATE/INSERT.'
+        )
+
+    def decay(self, seconds):
+        return 0.5 ** (seconds / (settings.TRENDING['HALF_LIFE_HOURS'] * 3600))
+
+    def decay_scores(self, factor, now, batch_size):
+        """Затухание существующих оценок пакетами по диапазонам pk."""
+        bounds = RecipeScore.objects.aggregate(
+            first=Min('pk'), last=Max('pk')
+        )
+        if bounds['first'] is None:
+            return
+        for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+            RecipeScore.objects.filter(
+                pk__gte=start, pk__lt=start + batch_size
+            ).update(score=F('score') * factor, updated=now)
+
+    def collect_events(self, since, until, now, batch_size):
+        """
+        Оценки событий, добавленных в (since, until], с затуханием
+        на момент now.
+        """
+        scores = defaultdict(float)
+        for model, weight in (
+            (Favorite, settings.TRENDING['FAVORITE_WEIGHT']),
+            (ShoppingCart, settings.TRENDING['CART_WEIGHT']),
+        ):
+            events = model.objects.filter(created__lte=until)
+            if since is not None:
+                events = events.filter(created__gt=since)
+            for recipe_id, created in events.values_list(
+                'recipe_id', 'created'
+            ).iterator(chunk_size=batch_size):
+                scores[recipe_id] += weight * self.decay(
+                    (now - created).total_seconds()
+                )
+        return scores
+
+    def save_scores(self, scores, now, batch_size):
+        recipe_ids = list(scores)
+        for start in range(0, len(recipe_ids), batch_size):
+            chunk = recipe_ids[start:start + batch_size]
+            existing = RecipeScore.objects.in_bulk(chunk)
+            for recipe_id, score in existing.items():
+                score.score += scores[recipe_id]
+                score.updated = now
+            RecipeScore.objects.bulk_update(
+                existing.values(), ['score', 'updated'], batch_size=batch_size
+            )
+            RecipeScore.objects.bulk_create(
+                [
+                    RecipeScore(
+                        recipe_id=recipe_id,
+                        score=scores[recipe_id],
+                        updated=now
+                    )
+                    for recipe_id in chunk if recipe_id not in existing
+                ],
+                batch_size=batch_size
+            )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        now = timezone.now()
+        until = now - timedelta(seconds=settings.TRENDING['SETTLE_SECONDS'])
+        batch_size = options['batch_size']
+        state = TrendingState.objects.select_for_update().first()
+        since = None
+        if state is None or options['full']:
+            RecipeScore.objects.all().delete()
+        else:
+            self.decay_scores(
+                self.decay((now - state.updated).total_seconds()),
+                now, batch_size
+            )
+            since = state.events_until
+            until = max(until, since)
+        scores = self.collect_events(since, until, now, batch_size)
+        self.save_scores(scores, now, batch_size)
+        state = state or TrendingState()
+        state.updated, state.events_until = now, until
+        state.save()
+        removed, _ = RecipeScore.objects.filter(
+            score__lt=settings.TRENDING['MIN_SCORE']
+        ).delete()
+        self.stdout.write(
+            f'Обновлено рецептов с новыми событиями: {len(scores)}, '
+            f'удалено устаревших оценок: {removed}'
+        )
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+CREATE_INDEX = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm;',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+    'ON recipes_ingredient USING gin (UPPER(name::text) gin_trgm_ops);',
+)
+DROP_INDEX = ('DROP INDEX IF EXISTS recipes_ingredient_name_trgm;',)
+
+
+def run_on_postgresql(statements):
+    """
+    GIN-индекс pg_trgm есть только в PostgreSQL,
+    на остальных СУБД поиск работает без него.
+    """
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_auto_20230309_1700'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgresql(CREATE_INDEX),
+            run_on_postgresql(DROP_INDEX),
+        ),
+    ]
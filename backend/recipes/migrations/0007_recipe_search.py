@@ -0,0 +1,61 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+POSTGRESQL_FORWARDS = (
+    "ALTER TABLE recipes_recipe ADD COLUMN IF NOT EXISTS search_vector "
+    "tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(text, '')), 'B')"
+    ") STORED;",
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector '
+    'ON recipes_recipe USING gin (search_vector);',
+)
+POSTGRESQL_BACKWARDS = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector;',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector;',
+)
+SQLITE_FORWARDS = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts '
+    "USING fts5(name, text, tokenize='unicode61');",
+    'INSERT INTO recipes_recipe_fts(rowid, name, text) '
+    'SELECT id, name, text FROM recipes_recipe;',
+)
+SQLITE_BACKWARDS = (
+    'DROP TABLE IF EXISTS recipes_recipe_fts;',
+)
+
+
+def run_for_vendor(postgresql, sqlite):
+    """
+    Полнотекстовый индекс рецептов: генерируемая колонка tsvector
+    с GIN-индексом в PostgreSQL, таблица FTS5 в SQLite (ее обновляют
+    сигналы из recipes.signals: триггеры SQLite теряются, когда Django
+    пересоздает таблицу рецептов в следующих миграциях).
+    Если SQLite собран без FTS5, поиск работает через icontains.
+    """
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        if vendor == 'postgresql':
+            for statement in postgresql:
+                schema_editor.execute(statement)
+        elif vendor == 'sqlite':
+            try:
+                for statement in sqlite:
+                    schema_editor.execute(statement)
+            except OperationalError:
+                pass
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(POSTGRESQL_FORWARDS, SQLITE_FORWARDS),
+            run_for_vendor(POSTGRESQL_BACKWARDS, SQLITE_BACKWARDS),
+        ),
+    ]
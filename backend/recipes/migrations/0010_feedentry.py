@@ -0,0 +1,58 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_feed(apps, schema_editor):
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    Subscribers = apps.get_model('users', 'Subscribers')
+    rows = Subscribers.objects.filter(
+        author__recipes__isnull=False
+    ).order_by().values_list(
+        'user_id', 'author__recipes__id', 'author__recipes__pub_date'
+    )
+    batch = []
+    for user_id, recipe_id, pub_date in rows.iterator(chunk_size=1000):
+        batch.append(
+            FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+        )
+        if len(batch) == 1000:
+            FeedEntry.objects.bulk_create(batch)
+            batch = []
+    FeedEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_recipe_trending'),
+        ('users', '0004_user_followers_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Лента подписок',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date', '-recipe'], name='feed_user_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_feed_entry'),
+        ),
+        migrations.RunPython(fill_feed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('updated', models.DateTimeField(verbose_name='Дата пересчета')),
+                ('events_until', models.DateTimeField(verbose_name='События учтены до')),
+            ],
+            options={
+                'verbose_name': 'Состояние пересчета рейтинга',
+                'verbose_name_plural': 'Состояние пересчета рейтинга',
+            },
+        ),
+    ]
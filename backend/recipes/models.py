@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from recipes.validators import validator_coocing_time, validator_amount
 from users.models import User
 
@@ -75,6 +76,12 @@ class Recipe(models.Model):
         upload_to='backend/media',
         verbose_name='Изображение'
     )
+    image_variants = models.JSONField(
+        verbose_name='Варианты изображения',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     text = models.TextField('Описание блюда')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -96,6 +103,16 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         ordering = ['-pub_date']
@@ -107,6 +124,20 @@ class Recipe(models.Model):
                 name='unique_author_name'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_favorites_count_idx'
+            ),
+            models.Index(
+                fields=['-in_carts_count', '-id'],
+                name='recipe_in_carts_count_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -162,6 +193,11 @@ class Favorite(models.Model):
         related_name='favorite',
         verbose_name='Рецепты'
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        default=timezone.now,
+        db_index=True
+    )
 
     class Meta:
         verbose_name = 'Избраное'
@@ -191,6 +227,11 @@ class ShoppingCart(models.Model):
         related_name='shopping_cart',
         verbose_name='Рецепты'
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        default=timezone.now,
+        db_index=True
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -204,3 +245,95 @@ class ShoppingCart(models.Model):
 
     def __str__(self) -> str:
         return f'{self.recipe} в списке покупок : {self.user}'
+
+
+class RecipeScore(models.Model):
+    """
+    Рейтинг популярности рецепта: сумма добавлений в избранное и списки
+    покупок с экспоненциальным затуханием по времени. Пересчитывается
+    командой update_trending.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField(
+        verbose_name='Рейтинг',
+        default=0,
+        db_index=True
+    )
+    updated = models.DateTimeField(
+        verbose_name='Дата пересчета'
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+
+    def __str__(self) -> str:
+        return f'{self.recipe}: {self.score:.2f}'
+
+
+class TrendingState(models.Model):
+    """
+    Состояние пересчета update_trending (одна строка): время прошлого
+    пересчета, от которого считается затухание оценок, и граница
+    времени добавления уже учтенных событий.
+    """
+    updated = models.DateTimeField(
+        verbose_name='Дата пересчета'
+    )
+    events_until = models.DateTimeField(
+        verbose_name='События учтены до'
+    )
+
+    class Meta:
+        verbose_name = 'Состояние пересчета рейтинга'
+        verbose_name_plural = 'Состояние пересчета рейтинга'
+
+    def __str__(self) -> str:
+        return f'События до {self.events_until}'
+
+
+class FeedEntry(models.Model):
+    """
+    Строка ленты подписок пользователя. Заполняется при публикации
+    рецепта (fan-out on write) и при подписке на автора.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_pub_date_idx'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.recipe} в ленте : {self.user}'
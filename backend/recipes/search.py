@@ -0,0 +1,144 @@
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import Exists, F, FloatField, OuterRef, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from recipes.models import IngredientRecipe, Recipe
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+
+
+@lru_cache(maxsize=None)
+def sqlite_fts_available():
+    """Таблица FTS5 создается миграцией, только если SQLite ее поддерживает."""
+    with connection.cursor() as cursor:
+        return FTS_TABLE in connection.introspection.table_names(cursor)
+
+
+def fts5_query(value):
+    """Запрос FTS5 из слов пользователя: все слова, каждое как префикс."""
+    return ' '.join(
+        '"{0}"*'.format(word.replace('"', '""')) for word in value.split()
+    )
+
+
+def update_sqlite_index(recipe):
+    if connection.vendor != 'sqlite' or not sqlite_fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe.pk]
+        )
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE}(rowid, name, text) VALUES (%s, %s, %s)',
+            [recipe.pk, recipe.name, recipe.text]
+        )
+
+
+def index_recipes(recipe_ids, batch_size=500):
+    """
+    Перестраивает строки FTS5 для рецептов, созданных bulk_create или
+    измененных update(): сигналы post_save для них не отправляются.
+    Список id передается пакетами из-за лимита параметров SQLite.
+    """
+    if connection.vendor != 'sqlite' or not sqlite_fts_available():
+        return
+    recipe_ids = list(recipe_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(recipe_ids), batch_size):
+            chunk = recipe_ids[start:start + batch_size]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                chunk
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE}(rowid, name, text) '
+                f'SELECT id, name, text FROM {Recipe._meta.db_table} '
+                f'WHERE id IN ({placeholders})',
+                chunk
+            )
+
+
+def delete_from_sqlite_index(recipe_id):
+    if connection.vendor != 'sqlite' or not sqlite_fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id]
+        )
+
+
+def search_recipes(queryset, value):
+    """
+    Полнотекстовый поиск рецептов по названию и описанию, а также
+    по названиям ингредиентов. Результат аннотирован search_rank
+    и отсортирован по нему; совпадения только по ингредиенту идут
+    после совпадений по тексту.
+    PostgreSQL: генерируемая колонка search_vector с GIN-индексом и
+    SearchRank. SQLite: FTS5 и bm25. Иначе - icontains.
+    Совпадения по тексту и по ингредиентам выбираются отдельными
+    запросами, объединенными UNION: каждый использует свой индекс
+    (search_vector или FTS5 и pg_trgm по названию ингредиента).
+    """
+    if not value.split():
+        return queryset
+    ingredient_ids = IngredientRecipe.objects.filter(
+        ingredient__name__icontains=value
+    ).order_by().values('recipe_id')
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import (
+            SearchQuery,
+            SearchRank,
+            SearchVectorField,
+        )
+
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        search_vector = RawSQL(
+            '"recipes_recipe"."search_vector"', [],
+            output_field=SearchVectorField()
+        )
+        text_ids = Recipe.objects.annotate(
+            search_vector=search_vector
+        ).filter(search_vector=query).order_by().values('id')
+        queryset = queryset.filter(
+            id__in=text_ids.union(ingredient_ids)
+        ).annotate(
+            search_vector=search_vector
+        ).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        )
+    elif connection.vendor == 'sqlite' and sqlite_fts_available():
+        match = fts5_query(value)
+        text_ids = Recipe.objects.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [match]
+        )).order_by().values('id')
+        queryset = queryset.filter(
+            id__in=text_ids.union(ingredient_ids)
+        ).annotate(
+            search_rank=Coalesce(RawSQL(
+                f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s '
+                f'AND {FTS_TABLE}.rowid = "recipes_recipe"."id"',
+                [match],
+                output_field=FloatField()
+            ), Value(0.0))
+        )
+    else:
+        queryset = queryset.annotate(
+            search_rank=Value(1.0, output_field=FloatField()),
+            has_ingredient=Exists(IngredientRecipe.objects.filter(
+                recipe=OuterRef('pk'),
+                ingredient__name__icontains=value
+            ))
+        ).filter(
+            Q(name__icontains=value)
+            | Q(text__icontains=value)
+            | Q(has_ingredient=True)
+        )
+    return queryset.order_by('-search_rank', '-pub_date', '-id')
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import Recipe
+from recipes.search import delete_from_sqlite_index, update_sqlite_index
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, **kwargs):
+    update_sqlite_index(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    delete_from_sqlite_index(instance.pk)
@@ -0,0 +1,123 @@
+import io
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+from api.cache import reference_cache
+from recipes.management.commands.load_data import iter_csv, iter_json
+from recipes.models import Ingredient
+
+ROWS = [
+    {'name': 'абрикосы', 'measurement_unit': 'г'},
+    {'name': 'абрикосы', 'measurement_unit': 'шт.'},
+    {'name': 'мука', 'measurement_unit': 'г'},
+]
+
+
+class ReadersTest(SimpleTestCase):
+    """Потоковое чтение JSON и CSV."""
+
+    def test_json_array_across_chunks(self):
+        file = io.StringIO(json.dumps(ROWS, ensure_ascii=False, indent=2))
+        self.assertEqual(list(iter_json(file, chunk_size=7)), ROWS)
+
+    def test_json_lines(self):
+        file = io.StringIO(''.join(
+            json.dumps(row, ensure_ascii=False) + '\n' for row in ROWS
+        ))
+        self.assertEqual(list(iter_json(file, chunk_size=5)), ROWS)
+
+    def test_json_reads_lazily(self):
+        file = io.StringIO(json.dumps(ROWS * 100))
+        rows = iter_json(file, chunk_size=64)
+        self.assertEqual(next(rows), ROWS[0])
+        self.assertLess(file.tell(), 200)
+
+    def test_json_truncated(self):
+        file = io.StringIO(json.dumps(ROWS)[:-10])
+        with self.assertRaises(CommandError):
+            list(iter_json(file, chunk_size=16))
+
+    def test_csv(self):
+        file = io.StringIO(
+            'name,measurement_unit\nабрикосы,г\n\n"мука, пшеничная",г\n'
+        )
+        self.assertEqual(list(iter_csv(file)), [
+            {'name': 'абрикосы', 'measurement_unit': 'г'},
+            {'name': 'мука, пшеничная', 'measurement_unit': 'г'},
+        ])
+        with self.assertRaises(CommandError):
+            list(iter_csv(io.StringIO('абрикосы,г,лишнее\n')))
+
+
+class LoadDataTest(TestCase):
+    """Команда load_data: пакетная загрузка и повторный запуск."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write(self, name, content):
+        path = self.directory / name
+        path.write_text(content, encoding='utf-8')
+        return str(path)
+
+    def load(self, path, *args):
+        stdout = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                'load_data', '--path', path, *args, stdout=stdout
+            )
+        return stdout.getvalue()
+
+    def get_ingredients(self):
+        return set(Ingredient.objects.values_list(
+            'name', 'measurement_unit'
+        ))
+
+    def test_load_json_and_rerun(self):
+        path = self.write('ingredients.json', json.dumps(ROWS))
+        version = reference_cache.get_version('ingredients')
+        output = self.load(path, '--batch-size', '2')
+        self.assertIn('добавлено: 3', output)
+        self.assertEqual(self.get_ingredients(), {
+            (row['name'], row['measurement_unit']) for row in ROWS
+        })
+        loaded_version = reference_cache.get_version('ingredients')
+        self.assertNotEqual(loaded_version, version)
+        # Повторный запуск: дубликаты пропускаются, версия не меняется
+        output = self.load(path, '--batch-size', '2')
+        self.assertIn('добавлено: 0', output)
+        self.assertEqual(Ingredient.objects.count(), 3)
+        self.assertEqual(
+            reference_cache.get_version('ingredients'), loaded_version
+        )
+
+    def test_load_csv_with_existing_rows(self):
+        Ingredient.objects.create(name='мука', measurement_unit='г')
+        path = self.write(
+            'ingredients.csv', 'name,measurement_unit\nмука,г\nсоль,г\n'
+        )
+        self.assertIn('добавлено: 1', self.load(path))
+        self.assertEqual(
+            self.get_ingredients(), {('мука', 'г'), ('соль', 'г')}
+        )
+
+    def test_dry_run(self):
+        path = self.write('ingredients.json', json.dumps(ROWS))
+        self.load(path, '--dry-run')
+        self.assertFalse(Ingredient.objects.exists())
+
+    def test_invalid_arguments(self):
+        for args in (
+            ('--path', self.write('ingredients.txt', '')),
+            ('--path', str(self.directory / 'missing.json')),
+            ('--path', self.write('ingredients.json', '[]'),
+             '--batch-size', '0'),
+        ):
+            with self.subTest(args=args):
+                with self.assertRaises(CommandError):
+                    call_command('load_data', *args, stdout=io.StringIO())
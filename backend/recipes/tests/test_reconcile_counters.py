@@ -0,0 +1,79 @@
+import io
+
+from django.core.management import call_command
+from django.test import TestCase
+from api.tests.base import RecipesDataMixin
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscribers, User
+
+
+class ReconcileCountersTest(RecipesDataMixin, TestCase):
+    """
+    Команда reconcile_counters. Рецепты и связи в тестовых данных
+    созданы без изменения счетчиков, поэтому все счетчики расходятся
+    с фактическими значениями.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        users, recipes = cls.users, cls.recipes
+        Favorite.objects.bulk_create([
+            Favorite(user=users[0], recipe=recipes[0]),
+            Favorite(user=users[1], recipe=recipes[0]),
+            Favorite(user=users[1], recipe=recipes[1]),
+        ])
+        ShoppingCart.objects.create(user=users[2], recipe=recipes[3])
+        Subscribers.objects.bulk_create([
+            Subscribers(user=users[1], author=users[0]),
+            Subscribers(user=users[2], author=users[0]),
+        ])
+        # Лишнее значение, которого нет в связях
+        Recipe.objects.filter(pk=recipes[5].pk).update(favorites_count=7)
+
+    def reconcile(self, *args):
+        stdout = io.StringIO()
+        call_command('reconcile_counters', *args, stdout=stdout)
+        return stdout.getvalue().splitlines()
+
+    def get_counters(self):
+        return (
+            dict(Recipe.objects.values_list('pk', 'favorites_count')),
+            dict(Recipe.objects.values_list('pk', 'in_carts_count')),
+            dict(User.objects.values_list('pk', 'recipes_count')),
+            dict(User.objects.values_list('pk', 'followers_count')),
+        )
+
+    def test_reconcile(self):
+        users, recipes = self.users, self.recipes
+        self.assertEqual(self.reconcile(), [
+            'Recipe.favorites_count: расхождений 3',
+            'Recipe.in_carts_count: расхождений 1',
+            'User.recipes_count: расхождений 3',
+            'User.followers_count: расхождений 1',
+        ])
+        favorites, carts, recipes_count, followers = self.get_counters()
+        self.assertEqual(favorites, {
+            recipe.pk: count
+            for recipe, count in zip(recipes, (2, 1, 0, 0, 0, 0))
+        })
+        self.assertEqual(carts[recipes[3].pk], 1)
+        self.assertEqual(sum(carts.values()), 1)
+        self.assertEqual(recipes_count, {user.pk: 2 for user in users})
+        self.assertEqual(followers, {
+            users[0].pk: 2, users[1].pk: 0, users[2].pk: 0
+        })
+        self.assertEqual(self.reconcile(), [
+            'Recipe.favorites_count: расхождений 0',
+            'Recipe.in_carts_count: расхождений 0',
+            'User.recipes_count: расхождений 0',
+            'User.followers_count: расхождений 0',
+        ])
+
+    def test_dry_run(self):
+        before = self.get_counters()
+        self.assertEqual(
+            self.reconcile('--dry-run')[0],
+            'Recipe.favorites_count: расхождений 3'
+        )
+        self.assertEqual(self.get_counters(), before)
@@ -0,0 +1,114 @@
+from unittest import SkipTest
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from rest_framework.test import APIClient
+from recipes.models import Ingredient, IngredientRecipe, Recipe
+from recipes.search import index_recipes, search_recipes, sqlite_fts_available
+from users.models import User
+
+
+class SqliteSearchTest(TestCase):
+    """Поиск рецептов через FTS5: ранжирование, ингредиенты, UNION."""
+
+    @classmethod
+    def setUpClass(cls):
+        sqlite_fts_available.cache_clear()
+        if connection.vendor != 'sqlite' or not sqlite_fts_available():
+            raise SkipTest('Нужен SQLite с FTS5.')
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@foodgram.ru',
+            password='password', first_name='Имя', last_name='Фамилия'
+        )
+        cls.sorrel = Ingredient.objects.create(
+            name='щавель', measurement_unit='г'
+        )
+        cls.beet = Ingredient.objects.create(
+            name='свекла', measurement_unit='г'
+        )
+        cls.borscht = cls.create_recipe(
+            'Борщ', 'Борщ на говяжьем бульоне.', [cls.beet]
+        )
+        cls.soup = cls.create_recipe(
+            'Суп', 'Почти как борщ, но без свеклы, зато с долгим '
+                   'рассказом о капусте, картофеле и моркови.',
+            [cls.beet]
+        )
+        cls.green = cls.create_recipe(
+            'Зеленые щи', 'Кислые щи.', [cls.sorrel]
+        )
+
+    @classmethod
+    def create_recipe(cls, name, text, ingredients):
+        recipe = Recipe.objects.create(
+            author=cls.author, name=name, text=text, cooking_time=10,
+            image='recipes/images/recipe.png'
+        )
+        IngredientRecipe.objects.bulk_create([
+            IngredientRecipe(recipe=recipe, ingredient=ingredient, amount=100)
+            for ingredient in ingredients
+        ])
+        return recipe
+
+    def search(self, value):
+        return list(search_recipes(Recipe.objects.all(), value))
+
+    def test_ranked_by_bm25(self):
+        found = self.search('борщ')
+        self.assertEqual(found, [self.borscht, self.soup])
+        self.assertGreater(found[0].search_rank, found[1].search_rank)
+        self.assertGreater(found[1].search_rank, 0)
+
+    def test_prefix_match(self):
+        self.assertEqual(self.search('бульон'), [self.borscht])
+
+    def test_ingredient_only_match_after_text_matches(self):
+        found = self.search('щавель')
+        self.assertEqual(found, [self.green])
+        self.assertEqual(found[0].search_rank, 0.0)
+
+    def test_union_of_text_and_ingredient_matches(self):
+        found = self.search('свекла')
+        self.assertEqual(set(found), {self.borscht, self.soup})
+        self.assertEqual(len(found), 2)
+        text_match = self.create_recipe('Свекла запеченная', 'Просто.', [])
+        found = self.search('свекла')
+        self.assertEqual(found[0], text_match)
+        self.assertEqual(len(found), 3)
+
+    def test_updated_and_deleted_recipes(self):
+        self.green.name = 'Щи с крапивой'
+        self.green.save()
+        self.assertEqual(self.search('крапив'), [self.green])
+        self.green.delete()
+        self.assertEqual(self.search('крапив'), [])
+
+    def test_bulk_created_recipes_after_index_recipes(self):
+        Recipe.objects.bulk_create([
+            Recipe(
+                author=self.author, name=f'Солянка {number}', text='Сборная.',
+                cooking_time=10, image='recipes/images/recipe.png'
+            )
+            for number in range(3)
+        ])
+        self.assertEqual(self.search('солянка'), [])
+        index_recipes(Recipe.objects.filter(
+            name__startswith='Солянка'
+        ).values_list('id', flat=True), batch_size=2)
+        self.assertEqual(len(self.search('солянка')), 3)
+        index_recipes(Recipe.objects.values_list('id', flat=True))
+        self.assertEqual(len(self.search('солянка')), 3)
+
+    def test_api_search(self):
+        cache.clear()
+        response = APIClient().get('/api/recipes/', {'search': 'борщ'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [self.borscht.id, self.soup.id]
+        )
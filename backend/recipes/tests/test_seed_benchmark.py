@@ -0,0 +1,59 @@
+import io
+import shutil
+import tempfile
+
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+from recipes.management.commands.seed_benchmark import BENCHMARK_IMAGE
+from recipes.models import IngredientRecipe, Recipe
+from recipes.search import search_recipes, sqlite_fts_available
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class SeedBenchmarkTest(TestCase):
+    """Синтетические данные для benchmark_api."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self, *args):
+        call_command(
+            'seed_benchmark', '--users=5', '--recipes=12',
+            '--ingredients=6', '--ingredients-per-recipe=3',
+            '--favorites=2', '--cart=2', '--follows=2', '--batch-size=4',
+            *args, stdout=io.StringIO()
+        )
+
+    def test_seed(self):
+        self.seed()
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Recipe.objects.count(), 12)
+        self.assertEqual(IngredientRecipe.objects.count(), 36)
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.seed('--flush')
+        self.assertEqual(Recipe.objects.count(), 12)
+
+    def test_image_saved_once(self):
+        self.seed()
+        names = set(Recipe.objects.values_list('image', flat=True))
+        self.assertEqual(names, {BENCHMARK_IMAGE})
+        with default_storage.open(BENCHMARK_IMAGE) as file:
+            self.assertEqual(Image.open(file).size, (400, 300))
+        self.seed('--flush')
+        self.assertEqual(
+            set(Recipe.objects.values_list('image', flat=True)), names
+        )
+
+    def test_recipes_indexed_for_search(self):
+        sqlite_fts_available.cache_clear()
+        self.seed()
+        found = search_recipes(Recipe.objects.all(), 'Рецепт 11')
+        self.assertEqual(found[0].name, 'Рецепт 11')
@@ -0,0 +1,124 @@
+import io
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from api.tests.base import RecipesDataMixin
+from recipes.management.commands.update_trending import Command
+from recipes.models import Favorite, RecipeScore, ShoppingCart, TrendingState
+
+HOUR = 3600
+
+
+@override_settings(TRENDING={
+    'HALF_LIFE_HOURS': 1.0,
+    'SETTLE_SECONDS': 300,
+    'FAVORITE_WEIGHT': 2.0,
+    'CART_WEIGHT': 1.0,
+    'MIN_SCORE': 0.01,
+    'BATCH_SIZE': 2,
+})
+class UpdateTrendingTest(RecipesDataMixin, TestCase):
+    """Пересчет рейтинга: затухание, инкрементальные запуски, граница."""
+
+    def setUp(self):
+        super().setUp()
+        self.start = timezone.now().replace(microsecond=0)
+
+    def at(self, seconds):
+        return self.start + timedelta(seconds=seconds)
+
+    def run_at(self, seconds, *args):
+        with mock.patch(
+            'recipes.management.commands.update_trending.timezone.now',
+            return_value=self.at(seconds)
+        ):
+            call_command('update_trending', *args, stdout=io.StringIO())
+
+    def favorite(self, user, recipe, seconds):
+        Favorite.objects.create(
+            user=self.users[user], recipe=self.recipes[recipe],
+            created=self.at(seconds)
+        )
+
+    def get_scores(self):
+        return {
+            self.recipes.index(score.recipe): score.score
+            for score in RecipeScore.objects.select_related('recipe')
+        }
+
+    def test_decay(self):
+        command = Command()
+        self.assertEqual(command.decay(0), 1.0)
+        self.assertAlmostEqual(command.decay(HOUR), 0.5)
+        self.assertAlmostEqual(command.decay(3 * HOUR), 0.125)
+
+    def test_first_run_counts_settled_events(self):
+        self.favorite(0, 0, 0)
+        self.favorite(1, 0, HOUR)
+        ShoppingCart.objects.create(
+            user=self.users[0], recipe=self.recipes[1], created=self.at(0)
+        )
+        self.favorite(0, 2, 2 * HOUR - 60)
+        self.run_at(2 * HOUR)
+        scores = self.get_scores()
+        self.assertEqual(set(scores), {0, 1})
+        self.assertAlmostEqual(scores[0], 2 * 0.25 + 2 * 0.5)
+        self.assertAlmostEqual(scores[1], 0.25)
+        state = TrendingState.objects.get()
+        self.assertEqual(state.updated, self.at(2 * HOUR))
+        self.assertEqual(state.events_until, self.at(2 * HOUR - 300))
+
+    def test_incremental_run(self):
+        self.favorite(0, 0, 0)
+        self.run_at(600)
+        self.favorite(1, 0, HOUR)
+        self.favorite(0, 1, HOUR)
+        self.run_at(HOUR + 600)
+        scores = self.get_scores()
+        self.assertAlmostEqual(
+            scores[0], 2 * 0.5 ** (7 / 6) + 2 * 0.5 ** (1 / 6)
+        )
+        self.assertAlmostEqual(scores[1], 2 * 0.5 ** (1 / 6))
+        self.assertEqual(RecipeScore.objects.filter(
+            updated=self.at(HOUR + 600)
+        ).count(), 2)
+
+    def test_late_commit_counted_next_run(self):
+        self.favorite(0, 0, 0)
+        self.run_at(600)
+        # Транзакция, начатая до запуска и закоммиченная после него
+        self.favorite(1, 1, 400)
+        self.run_at(1200)
+        self.assertAlmostEqual(
+            self.get_scores()[1], 2 * 0.5 ** (800 / HOUR)
+        )
+
+    def test_empty_scores_not_rescanned(self):
+        self.favorite(0, 0, 0)
+        self.run_at(600)
+        RecipeScore.objects.all().delete()
+        self.run_at(1200)
+        self.assertEqual(self.get_scores(), {})
+
+    def test_scores_below_min_removed(self):
+        self.favorite(0, 0, 0)
+        self.run_at(600)
+        self.run_at(10 * HOUR)
+        self.assertEqual(self.get_scores(), {})
+        self.favorite(1, 1, 10 * HOUR)
+        self.run_at(10 * HOUR + 600)
+        self.assertEqual(set(self.get_scores()), {1})
+
+    def test_full_recount(self):
+        self.favorite(0, 0, 0)
+        self.favorite(1, 1, 0)
+        self.run_at(600)
+        Favorite.objects.filter(recipe=self.recipes[1]).delete()
+        self.run_at(1200, '--full')
+        scores = self.get_scores()
+        self.assertEqual(set(scores), {0})
+        self.assertAlmostEqual(scores[0], 2 * 0.5 ** (1200 / HOUR))
+        self.assertEqual(TrendingState.objects.count(), 1)
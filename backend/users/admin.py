@@ -7,7 +7,9 @@ class UserAdmin(admin.ModelAdmin):
     list_display = (
         'email',
         'username',
-        'first_name'
+        'first_name',
+        'recipes_count',
+        'followers_count'
     )
     list_filter = (
         'email',
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:46
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_followers_count(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Subscribers = apps.get_model('users', 'Subscribers')
+    User.objects.update(followers_count=Coalesce(Subquery(
+        Subscribers.objects.filter(author=OuterRef('pk')).order_by().values(
+            'author'
+        ).annotate(count=Count('pk')).values('count')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_recipes_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество подписчиков'),
+        ),
+        migrations.RunPython(fill_followers_count, migrations.RunPython.noop),
+    ]
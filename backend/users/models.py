@@ -14,6 +14,16 @@ class User(AbstractUser):
     last_name = models.CharField(
         max_length=150
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False
+    )
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = ['email', ]
 